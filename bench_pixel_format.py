@@ -0,0 +1,48 @@
+import argparse
+import time
+import numpy as np
+from pixel_format import CONVERTERS, get_converter
+
+
+# Test frames: random noise (worst case for caches) and a smooth gradient (shows banding)
+def make_frames(width, height):
+    noise = np.random.RandomState(0).randint(0, 256, (height, width, 3)).astype(np.uint8)
+    ramp = np.linspace(0, 255, width).astype(np.uint8)
+    gradient = np.dstack([np.tile(ramp, (height, 1))] * 3)
+    return [('noise', noise), ('gradient', gradient)]
+
+def bench_converter(converter, image, dst, iterations):
+    # Warm up scratch buffers and lookup tables before timing
+    converter(image, dst)
+    start = time.perf_counter()
+    for i in range(iterations):
+        converter(image, dst)
+    elapsed = time.perf_counter() - start
+    return elapsed * 1e9 / (iterations * image.shape[0] * image.shape[1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BGR to RGB565 converters")
+    parser.add_argument('--width', type=int, default=720)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--stride-padding', type=int, default=0,
+                        help="extra bytes per framebuffer row")
+    args = parser.parse_args()
+
+    line_length = args.width * 2 + args.stride_padding
+    mapping = np.zeros((args.height, line_length), dtype=np.uint8)
+    dst = np.ndarray((args.height, args.width, 2), dtype=np.uint8, buffer=mapping,
+                     strides=(line_length, 2, 1))
+
+    print("{}x{}, line_length={}, {} iterations".format(args.width, args.height, line_length,
+                                                      args.iterations))
+    for frame_name, image in make_frames(args.width, args.height):
+        for name in sorted(CONVERTERS):
+            converter = get_converter(name, 16)
+            ns_per_pixel = bench_converter(converter, image, dst, args.iterations)
+            frame_ms = ns_per_pixel * args.width * args.height / 1e6
+            print("{:<10} {:<8} {:8.2f} ns/pixel {:8.2f} ms/frame".format(
+                frame_name, name, ns_per_pixel, frame_ms))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import functools
+import sys
+import time
+import tracemalloc
+import types
+import cv2
+import numpy as np
+import scenes
+from frame_ingest import FORMAT_BGR888
+from framebuffer import SimulatedFramebuffer
+from frame_timing import FrameTimer
+from event_log import WARNING
+from i2c_bus import FakeI2CBus, set_default_bus
+from render_pipeline import PipelineFramebuffer
+
+cv2.ocl.setUseOpenCL(False)
+
+
+# Stand-ins for the DLP2000 control library, so the display engine can be imported
+# on a machine without the projector. Every DPP2607 call is recorded and succeeds.
+class FakeDataLog(object):
+
+    def __init__(self, log_dir=None, test_name=None):
+        self.cols = []
+
+    def add_col(self, name, value):
+        self.cols.append((name, value))
+
+    def log(self):
+        pass
+
+    def close(self):
+        pass
+
+def install_fake_controller():
+    calls = []
+    control = types.ModuleType('control')
+    control.calls = calls
+
+    def recorder(name, result=None):
+        def call(*args):
+            calls.append((name,) + args)
+            return result
+        return call
+
+    for name in ['Open', 'Close', 'SetSlaveAddr', 'SetIODebug', 'Write_SystemReset',
+                 'Write_VideoSourceSelection', 'Write_VideoPixelFormat', 'Write_VideoResolution']:
+        setattr(control, 'DPP2607_' + name, recorder('DPP2607_' + name))
+    control.DPP2607_Read_SystemStatus = recorder('DPP2607_Read_SystemStatus', 0)
+    control.DataLog = FakeDataLog
+    control.datalogConstants = lambda datalog: None
+    control.SourceSel = types.SimpleNamespace(EXTERNAL_VIDEO_PARALLEL_I_F_=0)
+    control.Resolution = types.SimpleNamespace(NHD_LANDSCAPE=0)
+    control.RGB888_24_BIT = 0
+
+    constants = types.ModuleType('Constants')
+    constants.LogDir = '.'
+    constants.SlaveAddr = 0x1b
+    constants.IODebug = 0
+
+    sys.modules['control'] = control
+    sys.modules['Constants'] = constants
+    set_default_bus(FakeI2CBus())
+    return control
+
+
+SCENES = [scene.name for scene in scenes.SCENES]
+
+
+# Frames per second and per-stage latency of an unpaced run, then a second run
+# under tracemalloc for the bytes allocated per frame
+def bench_scene(name, args):
+    from display_engine import DisplayEngine
+
+    engine = DisplayEngine(width=args.width, height=args.height, buffers=args.buffers)
+    # Key and message events would flood the console and the allocation figures
+    engine.log.level = WARNING
+    fb_factory = functools.partial(SimulatedFramebuffer, args.width, args.height, args.bpp,
+                                   buffers=args.buffers, converter=args.converter)
+    engine.open_framebuffer(PipelineFramebuffer(fb_factory) if args.pipeline else fb_factory())
+    engine.switch(name)
+    scene = engine.scenes[name]
+    controller = types.SimpleNamespace(addr=('bench', 0), closing=False)
+    engine.on_control_connect(controller)
+    streamed = np.random.RandomState(0).randint(0, 256, (args.height, args.width, 3)).astype(np.uint8)
+
+    def frame(index):
+        if args.keys_every and index % args.keys_every == 0:
+            # A controller toggling keys over the control protocol, and a CLICK message
+            key = index // args.keys_every % 10 + 1
+            engine.handle_control(controller, 'TOGGLE {}\n'.format(key).encode())
+            engine.handle_message(types.SimpleNamespace(addr=('bench', 1), closing=False), b'CLICK')
+        if name == 'stream':
+            # What the frame receiver does once a frame is read into a mailbox buffer
+            buffer = engine.frames.acquire(streamed.shape)
+            np.copyto(buffer, streamed)
+            engine.frames.publish(buffer, (index, FORMAT_BGR888))
+        # Event-driven scenes would otherwise skip the frame when nothing changed
+        scene.invalidate()
+        engine.render_frame()
+
+    def run_frames(frames):
+        for index in range(frames):
+            frame(index)
+
+    try:
+        # Warm up static layers, atlases and scratch buffers before timing
+        warmup_timer = FrameTimer(window=args.alloc_frames)
+        engine.use_timer(warmup_timer)
+        run_frames(args.warmup)
+
+        timer = FrameTimer(window=args.frames)
+        engine.use_timer(timer)
+        start = time.perf_counter()
+        run_frames(args.frames)
+        elapsed = time.perf_counter() - start
+        stats = timer.stats()
+
+        # The warm-up timer already holds its rings, so it allocates nothing here
+        engine.use_timer(warmup_timer)
+        tracemalloc.start()
+        base_current, base_peak = tracemalloc.get_traced_memory()
+        run_frames(args.alloc_frames)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        engine.fb.close()
+        engine.log.close()
+
+    print("{}: {} frames in {:.3f} s, {:.1f} FPS".format(name, args.frames, elapsed, args.frames / elapsed))
+    for stage, values in stats.items():
+        print("  {:<10} p50 {p50:7.3f} p95 {p95:7.3f} p99 {p99:7.3f} max {max:7.3f} ms".format(stage, **values))
+    print("  allocations: peak {:.1f} KiB above baseline, {:.1f} KiB retained after {} frames".format(
+        (peak - base_current) / 1024.0, (current - base_current) / 1024.0, args.alloc_frames))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the display engine scenes without a projector")
+    parser.add_argument('--scene', choices=sorted(SCENES), action='append',
+                        help="scene to run (repeatable, default all)")
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--warmup', type=int, default=30)
+    parser.add_argument('--alloc-frames', type=int, default=100,
+                        help="frames traced for allocations")
+    parser.add_argument('--width', type=int, default=720)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--bpp', type=int, default=16)
+    parser.add_argument('--buffers', type=int, default=2)
+    parser.add_argument('--converter', default='opencv')
+    parser.add_argument('--keys-every', type=int, default=10,
+                        help="frames between simulated key presses (0 for none)")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="convert and write frames in a separate output process")
+    args = parser.parse_args()
+
+    install_fake_controller()
+    print("{}x{} {} bpp, {} buffers, converter {}{}".format(args.width, args.height, args.bpp,
+                                                            args.buffers, args.converter,
+                                                            ", render pipeline" if args.pipeline else ""))
+    for name in args.scene or SCENES:
+        bench_scene(name, args)
+
+if __name__ == "__main__":
+    main()
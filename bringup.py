@@ -0,0 +1,93 @@
+import time
+import control
+
+# Bring-up stages and the fixed delay the projector scripts always slept after
+# them. Polling never waits longer than this, so bring-up is never slower.
+STAGES = {
+    'controller': 5.0,  # after DPP2607_Open, before the first register write
+    'i2c': 1.0,         # after the I2C register writes
+    'reset': 2.0,       # after DPP2607_Write_SystemReset
+    'video': 1.0,       # after the video input configuration
+}
+
+STATUS_READ = 'DPP2607_Read_SystemStatus'
+
+
+# Waits for the projector controller between bring-up steps. For a stage listed
+# in `ready_bits` ({stage: bits that must be set in the status word}, taken from
+# the DPP2607 register map) the status is polled with `probe()`, which returns
+# the status word, or None (or raises) while the controller is not answering,
+# and the stage ends as soon as the bits are set or after its fixed delay at
+# the latest. Other stages, and every stage without a probe, sleep the fixed
+# delay. No ready bits are known by default. The time spent in every stage is
+# kept in `timings`, the last status read in `status`.
+class Bringup(object):
+
+    def __init__(self, probe=None, ready_bits=None, poll_interval=0.05, stages=None,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.probe = probe if probe is not None else default_probe()
+        self.ready_bits = dict(ready_bits or {})
+        self.poll_interval = poll_interval
+        self.stages = dict(STAGES)
+        if stages:
+            self.stages.update(stages)
+        self.clock = clock
+        self.sleep = sleep
+        # (stage, seconds, outcome) with outcome 'ready', 'timeout' or 'delay'
+        self.timings = []
+        self.status = None
+
+    # Returns True if the controller reported ready (or the fixed delay elapsed)
+    # and False if a polled stage did not become ready within its delay
+    def wait_ready(self, stage):
+        delay = self.stages[stage]
+        required = self.ready_bits.get(stage)
+        start = self.clock()
+
+        if self.probe is None or required is None:
+            self.sleep(delay)
+            return self._record(stage, start, 'delay')
+
+        deadline = start + delay
+        self.status = None
+        while True:
+            try:
+                status = self.probe()
+                if status is not None:
+                    self.status = status = int(status)
+                    if status & required == required:
+                        return self._record(stage, start, 'ready')
+            except Exception:
+                pass
+            now = self.clock()
+            if now >= deadline:
+                self._record(stage, start, 'timeout')
+                return False
+            self.sleep(min(self.poll_interval, deadline - now))
+
+    def _record(self, stage, start, outcome):
+        elapsed = self.clock() - start
+        self.timings.append((stage, elapsed, outcome))
+        if outcome == 'timeout':
+            print("Bring-up stage '{}': timeout after {:.3f} s, last status {}".format(
+                stage, elapsed, format_status(self.status)))
+        else:
+            print("Bring-up stage '{}': {} after {:.3f} s".format(stage, outcome, elapsed))
+        return True
+
+    def total(self):
+        return sum(elapsed for stage, elapsed, outcome in self.timings)
+
+    def summary(self):
+        stages = ", ".join("{} {:.3f} s ({})".format(stage, elapsed, outcome)
+                           for stage, elapsed, outcome in self.timings)
+        return "Bring-up waited {:.3f} s: {}".format(self.total(), stages)
+
+
+def format_status(status):
+    return "none" if status is None else "0x{:02x}".format(status)
+
+# The control module's system status read, or None if it has none. The read
+# raises while the controller is not responding.
+def default_probe():
+    return getattr(control, STATUS_READ, None)
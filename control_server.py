@@ -0,0 +1,195 @@
+import errno
+import selectors
+import socket
+import time
+
+
+class ControlClient(object):
+
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        self.last_activity = time.monotonic()
+        self.closing = False
+
+    # Queue a reply; it is sent when the socket becomes writable
+    def send(self, data):
+        self.outbuf += data
+
+
+# Single-threaded TCP control server built on selectors. Every connection is
+# served from one loop, so a dozen controllers cost no threads. `handler(client, data)`
+# is called with each chunk received and may return bytes to send back.
+# Connections beyond `max_clients`, idle for `idle_timeout` seconds or not reading
+# their replies (more than `max_pending` bytes queued) are closed.
+class ControlServer(object):
+
+    def __init__(self, handler, host='0.0.0.0', port=8888, max_clients=16, idle_timeout=300.0,
+                 max_pending=65536, recv_size=4096, on_connect=None, on_disconnect=None):
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.max_pending = max_pending
+        self.recv_size = recv_size
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.selector = None
+        self.server = None
+        self.clients = {}
+        self.running = False
+        self._wakeup_r, self._wakeup_w = None, None
+
+    def start(self):
+        self.selector = selectors.DefaultSelector()
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((self.host, self.port))
+        self.server.listen(self.max_clients)
+        self.server.setblocking(False)
+        self.port = self.server.getsockname()[1]
+        self.selector.register(self.server, selectors.EVENT_READ, None)
+
+        # Lets stop() interrupt a blocking select from another thread
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self.selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+        self.running = True
+        print("TCP server started on port {}".format(self.port))
+
+    def serve_forever(self, poll_interval=1.0):
+        if self.selector is None:
+            self.start()
+        try:
+            while self.running:
+                self.poll(poll_interval)
+        finally:
+            self.close()
+
+    # Run one iteration of the event loop, waiting at most `timeout` seconds
+    def poll(self, timeout=0.0):
+        for key, events in self.selector.select(timeout):
+            if key.fileobj is self.server:
+                self._accept()
+            elif key.fileobj is self._wakeup_r:
+                try:
+                    self._wakeup_r.recv(64)
+                except (BlockingIOError, InterruptedError):
+                    pass
+            else:
+                client = key.data
+                if events & selectors.EVENT_READ:
+                    self._read(client)
+                if events & selectors.EVENT_WRITE and client.sock.fileno() != -1:
+                    self._flush(client)
+        self._expire_idle()
+
+    def stop(self):
+        self.running = False
+        if self._wakeup_w is not None:
+            try:
+                self._wakeup_w.send(b'x')
+            except OSError:
+                pass
+
+    def close(self):
+        for client in list(self.clients.values()):
+            self._drop(client)
+        if self.selector is not None:
+            self.selector.close()
+            self.selector = None
+        for sock in (self.server, self._wakeup_r, self._wakeup_w):
+            if sock is not None:
+                sock.close()
+        self.server = self._wakeup_r = self._wakeup_w = None
+
+    def _accept(self):
+        try:
+            sock, addr = self.server.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        if len(self.clients) >= self.max_clients:
+            print("Rejecting {0}: {1} clients connected".format(addr, len(self.clients)))
+            sock.close()
+            return
+        sock.setblocking(False)
+        client = ControlClient(sock, addr)
+        self.clients[sock.fileno()] = client
+        self.selector.register(sock, selectors.EVENT_READ, client)
+        print("{0} connected".format(addr))
+        if self.on_connect is not None:
+            self.on_connect(client)
+
+    def _read(self, client):
+        try:
+            data = client.sock.recv(self.recv_size)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            print("Client error: {0}".format(e))
+            self._drop(client)
+            return
+        if not data:
+            self._drop(client)
+            return
+
+        client.last_activity = time.monotonic()
+        try:
+            reply = self.handler(client, data)
+        except Exception as e:
+            print("Client error: {0}".format(e))
+            self._drop(client)
+            return
+        if reply:
+            client.send(reply)
+        if client.outbuf:
+            self._flush(client)
+
+    def _flush(self, client):
+        try:
+            sent = client.sock.send(client.outbuf)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError as e:
+            if e.errno not in (errno.EPIPE, errno.ECONNRESET):
+                print("Client error: {0}".format(e))
+            self._drop(client)
+            return
+        del client.outbuf[:sent]
+
+        if len(client.outbuf) > self.max_pending:
+            print("Dropping {0}: not reading replies".format(client.addr))
+            self._drop(client)
+        elif client.closing and not client.outbuf:
+            self._drop(client)
+        else:
+            events = selectors.EVENT_READ
+            if client.outbuf:
+                events |= selectors.EVENT_WRITE
+            self.selector.modify(client.sock, events, client)
+
+    def _expire_idle(self):
+        if self.idle_timeout is None:
+            return
+        now = time.monotonic()
+        for client in list(self.clients.values()):
+            if now - client.last_activity > self.idle_timeout:
+                print("Closing idle connection {0}".format(client.addr))
+                self._drop(client)
+
+    def _drop(self, client):
+        fileno = client.sock.fileno()
+        if fileno == -1:
+            return
+        self.clients.pop(fileno, None)
+        try:
+            self.selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
+        print("{0} disconnected".format(client.addr))
+        if self.on_disconnect is not None:
+            self.on_disconnect(client)
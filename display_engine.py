@@ -0,0 +1,352 @@
+import collections
+import datetime
+import functools
+import logging
+import threading
+import time
+import cv2
+from control import *
+from Constants import *
+from bringup import Bringup, format_status
+from control_server import ControlServer
+from dpp2607 import RegisterShadow, VIDEO_CONFIG
+from event_log import EventLog
+from fingertips import FingertipInput
+from frame_timing import FrameTimer
+from frame_ingest import STREAM_PORT, FrameDecoder, FrameMailbox, FrameReceiver
+from framebuffer import Framebuffer
+from i2c_bus import DISPLAY_I2C_WRITES, run_i2c_commands
+from key_state import KeyState
+from keyboard_renderer import KeyLayout, key_rectangles
+from render_pipeline import PipelineFramebuffer
+from protocol import (Command, Decoder, ProtocolError, encode_reply, encode_stats, mask_to_keys,
+                      scene_requests, wants_stats)
+from scenes import default_scenes
+from scheduler import FrameScheduler, RenderSignal
+from snapshot import SnapshotWriter
+
+cv2.ocl.setUseOpenCL(False)
+
+# Target frame rate of the render loop
+FPS = 60
+# Keyboard control protocol (see protocol.py)
+CONTROL_PORT = 8888
+# One-shot text messages: CLICK for the TCP demo, STATS, SCENE <name>
+MESSAGE_PORT = 12345
+# In event-driven scenes, repaint at least this often in seconds (None to disable)
+KEEPALIVE_INTERVAL = 1.0
+# Seconds between frame timing summaries in the log
+STATS_INTERVAL = 60.0
+# Frames between periodic snapshots
+SNAPSHOT_INTERVAL = 3600
+# Threads decoding JPEG/PNG frames from the stream port
+DECODE_WORKERS = 2
+
+
+# Owns everything the projector scripts used to duplicate: DPP2607 bring-up, the
+# framebuffer, frame pacing, the control servers, key state, logging and
+# snapshots. What is drawn comes from scenes (see scenes.py); switch() changes
+# the scene at runtime, from any thread, without touching the projector setup.
+class DisplayEngine(object):
+
+    def __init__(self, scenes=None, fps=FPS, buffers=2, width=720, height=480, render_mode='event',
+                 pipeline=False):
+        self.width = width
+        self.height = height
+        self.buffers = buffers
+        # Convert and write frames in a separate output process (see render_pipeline.py)
+        self.pipeline = pipeline
+        # 'event' lets event-driven scenes idle between changes, 'continuous' renders every slot
+        self.render_mode = render_mode
+        self.render_signal = RenderSignal()
+        self.key_state = KeyState(on_change=self.render_signal.notify)
+        self.messages = collections.deque(maxlen=64)
+        # Newest streamed frame for the 'stream' scene
+        self.frames = FrameMailbox()
+        self.frame_receiver = None
+        self.frame_decoder = None
+        self.fingertips = None
+        self.log = EventLog()
+        self.frame_timer = FrameTimer()
+        self.scheduler = FrameScheduler(fps)
+        self.display = RegisterShadow()
+        self.bringup = Bringup()
+        self.snapshots = None
+        self.fb = None
+        self.servers = []
+        self.scenes = collections.OrderedDict()
+        self.scene = None
+        self._next_scene = None
+        self.frame_count = 0
+        for scene in scenes if scenes is not None else default_scenes(width, height):
+            self.add_scene(scene)
+
+    def add_scene(self, scene):
+        self.scenes[scene.name] = scene
+
+    # Make `name` the current scene from the next frame on. Returns False if unknown.
+    def switch(self, name):
+        name = name.strip().lower()
+        if name not in self.scenes:
+            return False
+        self._next_scene = self.scenes[name]
+        self.render_signal.notify()
+        return True
+
+    def _apply_switch(self):
+        scene, self._next_scene = self._next_scene, None
+        if scene is None or scene is self.scene:
+            return
+        if self.scene is not None:
+            self.scene.stop(self)
+        self.log.info("Switching scene: {0} -> {1}", self.scene.name if self.scene else None, scene.name)
+        self.scene = scene
+        scene.start(self)
+
+    # Hardware bring-up
+
+    def open_controller(self):
+        print("Opening DLP2000...")
+        DPP2607_Open()
+        print("Setting slave address...")
+        DPP2607_SetSlaveAddr(SlaveAddr)
+        print("Setting IO debug...")
+        DPP2607_SetIODebug(IODebug)
+
+        print("Initializing DLP2000...")
+        self.wait_ready('controller')
+
+    def initialize_display(self):
+        print("Initializing display...")
+        self.display.write_registers(DISPLAY_I2C_WRITES)
+        self.wait_ready('i2c')
+        self.display.reset()
+        self.wait_ready('reset')
+        self.display.configure(VIDEO_CONFIG)
+        self.wait_ready('video')
+        self.display.write_registers(DISPLAY_I2C_WRITES)
+        print(self.display.summary())
+        print(self.bringup.summary())
+
+    # A polled stage that is not ready within its fixed delay is logged and
+    # bring-up carries on, as it did after the fixed delays
+    def wait_ready(self, stage):
+        if not self.bringup.wait_ready(stage):
+            self.log.warning("Bring-up stage '{0}' not ready after its delay, status {1}",
+                             stage, format_status(self.bringup.status))
+            return False
+        return True
+
+    # Use `fb` (e.g. a SimulatedFramebuffer) or open /dev/fb0, in the output process
+    # if the engine runs the render pipeline
+    def open_framebuffer(self, fb=None):
+        if fb is None and self.pipeline:
+            fb = PipelineFramebuffer(functools.partial(Framebuffer, buffers=self.buffers))
+        self.fb = fb if fb is not None else Framebuffer(buffers=self.buffers)
+        self.fb.timer = self.frame_timer
+        self.fb.clear()
+        print("Framebuffer initialized")
+
+    def use_timer(self, timer):
+        self.frame_timer = timer
+        if self.fb is not None:
+            self.fb.timer = timer
+
+    # Input
+
+    # Listen on the given ports; a port left as None is not opened
+    def start_servers(self, control_port=None, message_port=None, stream_port=None):
+        servers = []
+        if control_port is not None:
+            servers.append(ControlServer(self.handle_control, '0.0.0.0', control_port,
+                                         on_connect=self.on_control_connect))
+        if message_port is not None:
+            servers.append(ControlServer(self.handle_message, '0.0.0.0', message_port))
+        for server in servers:
+            server.start()
+            thread = threading.Thread(target=server.serve_forever)
+            thread.daemon = True
+            thread.start()
+            self.servers.append(server)
+
+        if stream_port is not None:
+            self.frame_decoder = FrameDecoder(self.frames, DECODE_WORKERS, on_frame=self.render_signal.notify)
+            self.frame_receiver = FrameReceiver(self.frames, '0.0.0.0', stream_port,
+                                                on_frame=self.render_signal.notify,
+                                                native_bytes=self.fb.bits_per_pixel // 8,
+                                                native_size=(self.fb.xres, self.fb.yres),
+                                                decoder=self.frame_decoder)
+            self.frame_receiver.start()
+
+    # Press keys with fingertips seen by a camera (or in a recorded video) over the keyboard
+    def start_camera(self, source=0, homography=None):
+        keyboard = self.scenes.get('keyboard')
+        if keyboard is not None:
+            layout = keyboard.renderer.layout
+        else:
+            layout = KeyLayout(key_rectangles(self.width, self.height), self.width, self.height)
+        self.fingertips = FingertipInput(self.key_state, layout, source, homography=homography,
+                                         on_keys=self.on_fingertip_keys)
+        self.fingertips.start()
+
+    def on_fingertip_keys(self, mask):
+        self.log.info("Fingertip keys: {0}", mask_to_keys(mask))
+
+    def on_control_connect(self, client):
+        client.decoder = Decoder()
+
+    # Called by the control server for every chunk a controller sends; see protocol.py
+    def handle_control(self, client, data):
+        try:
+            commands = client.decoder.feed(data)
+        except ProtocolError as e:
+            client.closing = True
+            return "ERR {}\n".format(e).encode()
+
+        replies = []
+        for command in commands:
+            for name in scene_requests(command) if not command.error else []:
+                if not self.switch(name):
+                    command = Command(command.seq, [], command.binary, "unknown scene: {}".format(name))
+            if command.error:
+                self.log.warning("Bad command from {0}: {1}", client.addr, command.error)
+                replies.append(encode_reply(command, 0, False))
+                continue
+            before = self.key_state.version
+            version, mask, green = self.key_state.apply(command.ops)
+            if version != before:
+                self.log.info("Active keys after: {0}, green screen mode: {1}",
+                              mask_to_keys(mask), "ON" if green else "OFF")
+            if wants_stats(command):
+                replies.append(encode_stats(command, self.frame_timer.stats()))
+            else:
+                replies.append(encode_reply(command, mask, green))
+        return b''.join(replies)
+
+    # One message per connection, answered and closed, as the old TCP demo server did
+    def handle_message(self, client, data):
+        message = data.decode('utf-8', 'replace').strip()
+        self.log.info("Message received from client: {0}", message)
+        client.closing = True
+        words = message.split(None, 1)
+        if words and words[0].upper() == 'STATS':
+            return (self.frame_timer.summary() + "\n").encode()
+        if words and words[0].upper() == 'SCENE':
+            name = words[1] if len(words) > 1 else ''
+            if not self.switch(name):
+                return "Unknown scene: {}\n".format(name).encode()
+            return "Scene: {}\n".format(name.strip().lower()).encode()
+        self.messages.append(message)
+        self.render_signal.notify()
+        return b"Response message from server"
+
+    # Render loop
+
+    def render_frame(self):
+        self._apply_switch()
+        self.frame_timer.begin()
+        self.scene.render(self)
+        self.frame_timer.end()
+
+        self.log.debug("Screen updated, frame count: {0}, scene: {1}", self.frame_count, self.scene.name,
+                       every=1.0)
+        self.frame_count += 1
+        if self.snapshots is not None and self.frame_count % SNAPSHOT_INTERVAL == 0:
+            self.snapshots.submit(self.scene.frame, '{}_{}'.format(self.scene.snapshot_name,
+                                                                    self.frame_count // SNAPSHOT_INTERVAL))
+
+    def run(self, duration=3600):
+        self.snapshots = SnapshotWriter()
+        # Draw the first frame right away
+        self.render_signal.notify()
+        start_time = time.time()
+        last_stats = start_time
+        while time.time() - start_time < duration:
+            scene = self._next_scene or self.scene
+            if self.render_mode == 'event' and scene.event_driven:
+                timeout = duration - (time.time() - start_time)
+                if KEEPALIVE_INTERVAL is not None:
+                    timeout = min(timeout, KEEPALIVE_INTERVAL)
+                if not self.render_signal.wait(max(timeout, 0)):
+                    # Keep-alive refresh: repaint everything
+                    scene.invalidate()
+                self.scheduler.resync()
+            self.scheduler.wait()
+            self.render_frame()
+
+            if time.time() - last_stats >= STATS_INTERVAL:
+                self.log.info(self.frame_timer.summary())
+                last_stats = time.time()
+
+        # Wait for periodic snapshots so the final one is not dropped
+        self.snapshots.flush()
+        self.snapshots.submit(self.scene.frame, '{}_final'.format(self.scene.snapshot_name))
+        self.snapshots.close()
+        print(self.snapshots.summary())
+        print(self.scheduler.summary())
+        print(self.frame_timer.summary())
+
+    def shutdown(self):
+        print("Cleaning up...")
+        for server in self.servers:
+            server.stop()
+        self.servers = []
+        if self.frame_receiver is not None:
+            self.frame_receiver.stop()
+            self.frame_decoder.close()
+            print(self.frames.summary())
+            print(self.frame_decoder.summary())
+            self.frame_receiver = self.frame_decoder = None
+        if self.fingertips is not None:
+            self.fingertips.stop()
+            print(self.fingertips.summary())
+            self.fingertips = None
+        run_i2c_commands()
+        if self.fb is not None:
+            self.fb.close()
+            self.fb = None
+        DPP2607_Close()
+        self.log.close()
+
+    # Bring the projector up, show `scene` for `duration` seconds and record the
+    # outcome in the test data log, as each of the projector scripts does.
+    # Only the servers the scene uses (its `inputs`) are started, unless `inputs`
+    # names others. `camera` is a video source for fingertip input, if any.
+    def main(self, test_name, scene, result, duration=3600, camera=None, inputs=None):
+        datalog = DataLog(LogDir, test_name)
+        if scene not in self.scenes:
+            raise ValueError("Unknown scene: {}".format(scene))
+        if inputs is None:
+            inputs = self.scenes[scene].inputs
+
+        logging.getLogger().setLevel(logging.DEBUG)
+        self.open_controller()
+        try:
+            self.initialize_display()
+            self.open_framebuffer()
+            self.start_servers(CONTROL_PORT if 'control' in inputs else None,
+                               MESSAGE_PORT if 'message' in inputs else None,
+                               STREAM_PORT if 'stream' in inputs else None)
+            if camera is not None:
+                self.start_camera(camera)
+            self.switch(scene)
+            self.run(duration)
+
+            print("Display result: {}".format(result))
+
+            datalog.add_col('Test name', test_name)
+            datalog.add_col('End Time', ' ' + str(datetime.datetime.now()))
+            datalog.add_col('Result', result)
+            datalog.add_col('P/F Result', "Pass" if "Pass" in result else "Fail")
+            datalog.log()
+        except Exception as e:
+            print("Test failed Exception: {}".format(str(e)))
+            datalogConstants(datalog)
+            datalog.add_col('Test name', test_name)
+            datalog.add_col('End Time', ' ' + str(datetime.datetime.now()))
+            datalog.add_col('Result', "Test Fail EXCEPTION")
+            datalog.add_col('P/F Result', "Fail")
+            datalog.log()
+        finally:
+            self.shutdown()
+            datalog.close()
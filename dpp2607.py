@@ -0,0 +1,85 @@
+import control
+from control import *
+from Constants import *
+from i2c_bus import DPP2607_I2C_ADDR, default_bus
+
+# Video input configuration applied after reset, in write order: (setting, value).
+# Each setting is written with the control module's DPP2607_Write_<setting>.
+VIDEO_CONFIG = [
+    ('VideoSourceSelection', SourceSel.EXTERNAL_VIDEO_PARALLEL_I_F_),
+    ('VideoPixelFormat', RGB888_24_BIT),
+    ('VideoResolution', Resolution.NHD_LANDSCAPE),
+]
+
+_UNKNOWN = object()
+
+
+# Last value written to each DPP2607 register or setting. Writes that would not
+# change the cached value are skipped; reset() issues DPP2607_Write_SystemReset
+# and forgets everything, since the controller is back at its defaults.
+class RegisterShadow(object):
+
+    def __init__(self, bus=None, addr=DPP2607_I2C_ADDR):
+        self.bus = bus
+        self.addr = addr
+        self.values = {}
+        self.writes = 0
+        self.skipped = 0
+
+    def invalidate(self):
+        self.values.clear()
+
+    def reset(self):
+        control.DPP2607_Write_SystemReset()
+        self.invalidate()
+        self.writes += 1
+
+    # Raw register block writes over I2C: list of (register, data bytes). Returns
+    # the number of registers written; on a bus error nothing is cached.
+    def write_registers(self, writes):
+        pending = []
+        for reg, data in writes:
+            data = bytes(data)
+            if self.values.get(('reg', reg), _UNKNOWN) == data:
+                self.skipped += 1
+            else:
+                pending.append((reg, data))
+        if not pending:
+            return 0
+
+        try:
+            bus = self.bus if self.bus is not None else default_bus()
+            bus.write_registers(self.addr, pending)
+        except Exception as e:
+            print("Exception while writing I2C registers: {}".format(str(e)))
+            return 0
+        for reg, data in pending:
+            self.values[('reg', reg)] = data
+        self.writes += len(pending)
+        return len(pending)
+
+    # Apply settings, a list of (setting, value), with the fewest writes: a setting
+    # that appears twice is written once with its last value, and settings already
+    # at their value are skipped. Order of first appearance is kept.
+    def configure(self, settings):
+        wanted = {}
+        order = []
+        for name, value in settings:
+            if name not in wanted:
+                order.append(name)
+            wanted[name] = value
+
+        written = 0
+        for name in order:
+            value = wanted[name]
+            if self.values.get(('setting', name), _UNKNOWN) == value:
+                self.skipped += 1
+                continue
+            getattr(control, 'DPP2607_Write_' + name)(value)
+            self.values[('setting', name)] = value
+            written += 1
+        self.writes += written
+        return written
+
+    def summary(self):
+        return "DPP2607 writes: {}, skipped: {}".format(self.writes, self.skipped)
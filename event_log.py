@@ -0,0 +1,113 @@
+import collections
+import sys
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+
+
+# Event log for render loops and other hot paths. log() appends a record to a
+# bounded deque (no lock, no formatting, no I/O); a background thread formats
+# and writes the records every `flush_interval` seconds, or flush() does it on
+# demand. When the buffer is full the oldest records are overwritten.
+#
+# Messages use str.format placeholders and are formatted at flush time, so args
+# should not be mutated after the call. With `every`, a message is recorded at
+# most once per that many seconds and the next record counts what was suppressed.
+class EventLog(object):
+
+    def __init__(self, level=INFO, capacity=4096, flush_interval=0.5, stream=None, clock=time.time):
+        self.level = level
+        self.capacity = capacity
+        self.stream = stream
+        self.clock = clock
+        self.records = collections.deque(maxlen=capacity)
+        self.overwritten = 0
+        self._last = {}
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.thread = None
+        if flush_interval is not None:
+            self.thread = threading.Thread(target=self._run, args=(flush_interval,))
+            self.thread.daemon = True
+            self.thread.start()
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def log(self, level, message, *args, every=None):
+        if level < self.level:
+            return
+        now = self.clock()
+        suppressed = 0
+        if every is not None:
+            last = self._last.get(message)
+            if last is not None and now - last[0] < every:
+                self._last[message] = (last[0], last[1] + 1)
+                return
+            if last is not None:
+                suppressed = last[1]
+            self._last[message] = (now, 0)
+        if len(self.records) == self.capacity:
+            self.overwritten += 1
+        self.records.append((now, level, message, args, suppressed))
+
+    def debug(self, message, *args, every=None):
+        self.log(DEBUG, message, *args, every=every)
+
+    def info(self, message, *args, every=None):
+        self.log(INFO, message, *args, every=every)
+
+    def warning(self, message, *args, every=None):
+        self.log(WARNING, message, *args, every=every)
+
+    def error(self, message, *args, every=None):
+        self.log(ERROR, message, *args, every=every)
+
+    # Write out everything recorded so far
+    def flush(self):
+        with self._flush_lock:
+            lines = []
+            while True:
+                try:
+                    record = self.records.popleft()
+                except IndexError:
+                    break
+                lines.append(format_record(*record))
+            if self.overwritten:
+                lines.append("{} log records overwritten before flush".format(self.overwritten))
+                self.overwritten = 0
+            if lines:
+                stream = self.stream if self.stream is not None else sys.stdout
+                stream.write('\n'.join(lines) + '\n')
+                stream.flush()
+
+    def close(self):
+        self._stop.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.flush()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print("Error flushing event log: {}".format(str(e)))
+
+
+def format_record(timestamp, level, message, args, suppressed):
+    try:
+        text = message.format(*args) if args else message
+    except Exception:
+        text = "{} {!r}".format(message, args)
+    if suppressed:
+        text += " ({} similar suppressed)".format(suppressed)
+    stamp = time.strftime('%H:%M:%S', time.localtime(timestamp))
+    return "{}.{:03d} {} {}".format(stamp, int(timestamp * 1000) % 1000, LEVEL_NAMES.get(level, level), text)
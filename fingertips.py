@@ -0,0 +1,254 @@
+import argparse
+import threading
+import time
+import cv2
+import numpy as np
+from frame_timing import FrameTimer
+from keyboard_renderer import KeyLayout, key_rectangles
+from protocol import OP_CLEAR, OP_SET, mask_to_keys
+
+# Skin tones in YCrCb (Y, Cr, Cb)
+SKIN_LOWER = (0, 133, 77)
+SKIN_UPPER = (255, 173, 127)
+# Frame rate assumed when the source does not report one
+DEFAULT_CAMERA_FPS = 30.0
+
+
+# Finds fingertips in camera frames and maps them to screen coordinates.
+#
+# Only the part of the frame under the keyboard (the keys' bounding box plus
+# `margin` screen pixels) is processed, downsampled by `scale`. A full detection
+# segments skin in that region and takes the topmost point of every large enough
+# blob as a tip. Between full detections, which run every `redetect_every`
+# frames, each tip is only looked for in a small window around where it was;
+# a tip lost from its window triggers a full detection straight away.
+#
+# `homography` maps camera pixels to screen pixels (e.g. found from the corner
+# markers); without it the camera is assumed to see exactly the screen.
+class FingertipDetector(object):
+
+    def __init__(self, layout, homography=None, scale=0.5, margin=40, min_area=60, max_tips=10,
+                 track_radius=16, redetect_every=10, skin_lower=SKIN_LOWER, skin_upper=SKIN_UPPER,
+                 timer=None):
+        self.layout = layout
+        self.homography = None if homography is None else np.asarray(homography, dtype=np.float64)
+        self.scale = scale
+        self.margin = margin
+        self.min_area = min_area
+        self.max_tips = max_tips
+        self.track_radius = track_radius
+        self.redetect_every = redetect_every
+        self.skin_lower = np.array(skin_lower, dtype=np.uint8)
+        self.skin_upper = np.array(skin_upper, dtype=np.uint8)
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        self.timer = timer
+        self.frame_shape = None
+        self.roi = None
+        self.to_screen = None
+        self.tips = None
+        self.since_detect = 0
+        self.detections = 0
+        self.tracked = 0
+
+    # Region of interest in camera pixels for frames of `shape`, and the matrix
+    # taking ROI pixels after downsampling to screen pixels
+    def _setup(self, shape):
+        height, width = shape[:2]
+        if self.homography is None:
+            camera_to_screen = np.diag([self.layout.width / float(width), self.layout.height / float(height), 1.0])
+        else:
+            camera_to_screen = self.homography
+        x0 = min(top_left[0] for text, top_left, bottom_right in self.layout.keys) - self.margin
+        y0 = min(top_left[1] for text, top_left, bottom_right in self.layout.keys) - self.margin
+        x1 = max(bottom_right[0] for text, top_left, bottom_right in self.layout.keys) + self.margin
+        y1 = max(bottom_right[1] for text, top_left, bottom_right in self.layout.keys) + self.margin
+        corners = np.array([[[x0, y0]], [[x1, y0]], [[x1, y1]], [[x0, y1]]], dtype=np.float64)
+        corners = cv2.perspectiveTransform(corners, np.linalg.inv(camera_to_screen)).reshape(-1, 2)
+        rx0, ry0 = np.clip(np.floor(corners.min(axis=0)).astype(int), 0, [width, height])
+        rx1, ry1 = np.clip(np.ceil(corners.max(axis=0)).astype(int), 0, [width, height])
+        self.roi = (rx0, ry0, rx1, ry1)
+        roi_to_camera = np.array([[1.0 / self.scale, 0, rx0], [0, 1.0 / self.scale, ry0], [0, 0, 1]])
+        self.to_screen = camera_to_screen.dot(roi_to_camera)
+        self.frame_shape = shape
+        self.tips = None
+
+    def _mark(self, stage):
+        if self.timer is not None:
+            self.timer.mark(stage)
+
+    def _segment(self, image):
+        mask = cv2.inRange(cv2.cvtColor(image, cv2.COLOR_BGR2YCrCb), self.skin_lower, self.skin_upper)
+        return cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.kernel)
+
+    # Topmost point of each skin blob, largest blobs first
+    def _detect(self, small):
+        mask = self._segment(small)
+        self._mark('segment')
+        contours = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+        blobs = []
+        for contour in contours:
+            area = cv2.contourArea(contour)
+            if area >= self.min_area:
+                blobs.append((area, contour[contour[:, :, 1].argmin()][0]))
+        blobs.sort(key=lambda blob: -blob[0])
+        self._mark('contours')
+        self.detections += 1
+        return np.array([tip for area, tip in blobs[:self.max_tips]], dtype=np.float64).reshape(-1, 2)
+
+    # Follow the previous tips within their windows; None if any was lost
+    def _track(self, small):
+        height, width = small.shape[:2]
+        radius = self.track_radius
+        tips = np.empty_like(self.tips)
+        for index, (x, y) in enumerate(self.tips.astype(int)):
+            x0, y0 = max(x - radius, 0), max(y - radius, 0)
+            x1, y1 = min(x + radius + 1, width), min(y + radius + 1, height)
+            ys, xs = np.nonzero(self._segment(small[y0:y1, x0:x1]))
+            # Gone, or reaching past the top of the window (the tip moved up out of it)
+            if ys.size < self.min_area // 4 or (ys.min() == 0 and y0 > 0):
+                self._mark('track')
+                return None
+            top = ys.argmin()
+            tips[index] = (x0 + xs[top], y0 + ys[top])
+        self._mark('track')
+        self.tracked += 1
+        return tips
+
+    # Fingertips in `frame` as an (n, 2) array of screen coordinates
+    def process(self, frame):
+        if frame.shape != self.frame_shape:
+            self._setup(frame.shape)
+        rx0, ry0, rx1, ry1 = self.roi
+        small = cv2.resize(frame[ry0:ry1, rx0:rx1], None, fx=self.scale, fy=self.scale,
+                           interpolation=cv2.INTER_AREA)
+        self._mark('roi')
+
+        tips = None
+        if self.tips is not None and len(self.tips) and self.since_detect < self.redetect_every:
+            tips = self._track(small)
+        if tips is None:
+            tips = self._detect(small)
+            self.since_detect = 0
+        self.since_detect += 1
+        self.tips = tips
+        if not len(tips):
+            return tips
+        return cv2.perspectiveTransform(tips.reshape(-1, 1, 2), self.to_screen).reshape(-1, 2)
+
+
+# Runs a FingertipDetector on a cv2.VideoCapture source in a thread of its own and
+# presses the keys under the fingertips in `key_state`. Only keys the fingers
+# pressed are released again, so keys set by network controllers are left alone.
+#
+# Frames that arrived while the previous one was being processed are skipped
+# with grab(), which does not decode them, so the detector always works on a
+# recent frame; `process_every` skips frames on top of that.
+class FingertipInput(object):
+
+    def __init__(self, key_state, layout, source=0, process_every=1, on_keys=None, **options):
+        self.key_state = key_state
+        self.source = source
+        self.process_every = max(1, process_every)
+        self.on_keys = on_keys
+        self.timer = FrameTimer()
+        self.detector = FingertipDetector(layout, timer=self.timer, **options)
+        self.capture = None
+        self.running = False
+        self.thread = None
+        self.mask = 0
+        self.captured = 0
+        self.processed = 0
+        self.skipped = 0
+
+    def start(self):
+        self.capture = cv2.VideoCapture(self.source)
+        if not self.capture.isOpened():
+            raise IOError("Cannot open video source {!r}".format(self.source))
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or DEFAULT_CAMERA_FPS
+        self.running = True
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        print("Fingertip input from {!r} at {:.0f} FPS".format(self.source, self.fps))
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(2.0)
+            self.thread = None
+
+    def _run(self):
+        skip = 0
+        try:
+            while self.running and self.capture.grab():
+                self.captured += 1
+                if skip > 0:
+                    skip -= 1
+                    self.skipped += 1
+                    continue
+                start = time.perf_counter()
+                self.timer.begin()
+                ok, frame = self.capture.retrieve()
+                if not ok:
+                    break
+                self.timer.mark('capture')
+                self.update(self.detector.process(frame))
+                self.timer.end()
+                self.processed += 1
+                # Frames the camera delivered meanwhile are already stale
+                skip = max(self.process_every - 1, int((time.perf_counter() - start) * self.fps))
+        finally:
+            self.capture.release()
+            self.running = False
+            self.update([])
+
+    # Press the keys under `tips` and release those no finger is on any more
+    def update(self, tips):
+        mask = self.detector.layout.mask(tips)
+        self.timer.mark('hit')
+        if mask == self.mask:
+            return
+        pressed, released = mask & ~self.mask, self.mask & ~mask
+        self.mask = mask
+        ops = []
+        if pressed:
+            ops.append((OP_SET, pressed))
+        if released:
+            ops.append((OP_CLEAR, released))
+        self.key_state.apply(ops)
+        if self.on_keys is not None:
+            self.on_keys(mask)
+
+    def summary(self):
+        return ("Fingertips: {} frames captured, {} processed, {} skipped, {} detections, {} tracked; {}".format(
+            self.captured, self.processed, self.skipped, self.detector.detections, self.detector.tracked,
+            self.timer.summary()))
+
+
+# Run the detector on a camera or recorded video and print the keys pressed
+def main():
+    from key_state import KeyState
+
+    parser = argparse.ArgumentParser(description="Detect fingertips over the projected keyboard")
+    parser.add_argument('--source', default='0', help="video file, or camera index")
+    parser.add_argument('--width', type=int, default=720, help="screen width")
+    parser.add_argument('--height', type=int, default=480, help="screen height")
+    parser.add_argument('--scale', type=float, default=0.5, help="downsampling of the keyboard region")
+    parser.add_argument('--process-every', type=int, default=1)
+    args = parser.parse_args()
+
+    layout = KeyLayout(key_rectangles(args.width, args.height), args.width, args.height)
+    source = int(args.source) if args.source.isdigit() else args.source
+    fingertips = FingertipInput(KeyState(), layout, source, args.process_every, scale=args.scale,
+                                on_keys=lambda mask: print("Keys: {}".format(mask_to_keys(mask) or "none")))
+    fingertips.start()
+    try:
+        while fingertips.running:
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        pass
+    fingertips.stop()
+    print(fingertips.summary())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+import argparse
+import socket
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+# Raw frame streaming. A client connects to STREAM_PORT and sends frames back to
+# back, each a header followed by width*height pixels with no padding:
+#
+#   header  >4sIHHBx  magic "DLPF", sequence number, width, height, format
+#   FORMAT_BGR888: 3 bytes per pixel, converted (and scaled) like any frame
+#   FORMAT_NATIVE: already in the framebuffer pixel format (e.g. RGB565 little
+#                  endian) and the framebuffer size, copied as is
+#   FORMAT_ENCODED: a JPEG or PNG image, preceded by its length (>I) instead of
+#                   raw pixels; width and height are informational
+#
+# There are no replies; a malformed header closes the connection.
+
+STREAM_PORT = 9999
+FRAME_MAGIC = b'DLPF'
+FRAME_HEADER = struct.Struct('>4sIHHBx')
+FORMAT_BGR888 = 0
+FORMAT_NATIVE = 1
+FORMAT_ENCODED = 2
+ENCODED_LENGTH = struct.Struct('>I')
+MAX_DIMENSION = 4096
+MAX_ENCODED = 8 << 20
+
+
+# Hands the newest frame from a producer thread to the render loop. Buffers are
+# recycled: the producer fills one from acquire(), publish() replaces any frame
+# the consumer has not taken yet (counted as dropped, latest frame wins), and the
+# consumer gives buffers back with release() once they are on screen.
+class FrameMailbox(object):
+
+    def __init__(self, spares=2):
+        self.lock = threading.Lock()
+        self.spares = spares
+        self._free = []
+        self._latest = None
+        self.published = 0
+        self.dropped = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        with self.lock:
+            while self._free:
+                frame = self._free.pop()
+                if frame.shape == shape and frame.dtype == dtype:
+                    return frame
+        return np.empty(shape, dtype=dtype)
+
+    def release(self, frame):
+        with self.lock:
+            if len(self._free) < self.spares:
+                self._free.append(frame)
+
+    # `info` travels with the frame, e.g. (sequence number, format)
+    def publish(self, frame, info=None):
+        with self.lock:
+            stale = self._latest
+            self._latest = (frame, info)
+            self.published += 1
+            if stale is not None:
+                self.dropped += 1
+                if len(self._free) < self.spares:
+                    self._free.append(stale[0])
+
+    # The newest (frame, info) not taken yet, or None
+    def take(self):
+        with self.lock:
+            item, self._latest = self._latest, None
+            return item
+
+    def summary(self):
+        return "Frames published: {}, dropped as stale: {}".format(self.published, self.dropped)
+
+
+# Receives streamed frames on a thread of its own, one client at a time, reading
+# each frame with recv_into straight into a buffer from the mailbox.
+# `native_bytes` is the framebuffer's bytes per pixel and `native_size` its
+# (width, height), used to size and check FORMAT_NATIVE frames. Encoded frames
+# are passed to `decoder` (a FrameDecoder); without one they are rejected.
+class FrameReceiver(object):
+
+    def __init__(self, mailbox, host='0.0.0.0', port=STREAM_PORT, on_frame=None,
+                 native_bytes=2, native_size=None, decoder=None):
+        self.mailbox = mailbox
+        self.decoder = decoder
+        self.host = host
+        self.port = port
+        self.on_frame = on_frame
+        self.native_bytes = native_bytes
+        self.native_size = native_size
+        self.server = None
+        self.client = None
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((self.host, self.port))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.running = True
+        self.thread = threading.Thread(target=self._serve)
+        self.thread.daemon = True
+        self.thread.start()
+        print("Frame stream server started on port {}".format(self.port))
+
+    def stop(self):
+        self.running = False
+        for sock in (self.client, self.server):
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                sock.close()
+        self.client = self.server = None
+
+    def _serve(self):
+        while self.running:
+            try:
+                client, addr = self.server.accept()
+            except OSError:
+                break
+            print("Frame stream from {0}".format(addr))
+            self.client = client
+            client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+            try:
+                self._receive(client)
+            except OSError as e:
+                if self.running:
+                    print("Frame stream error: {0}".format(e))
+            finally:
+                client.close()
+                self.client = None
+            print("Frame stream from {0} ended".format(addr))
+
+    def _receive(self, client):
+        header = bytearray(FRAME_HEADER.size)
+        header_view = memoryview(header)
+        length = bytearray(ENCODED_LENGTH.size)
+        if self.decoder is not None:
+            # Sequence numbers start over with each connection
+            self.decoder.reset()
+        while self.running:
+            if not recv_exact(client, header_view):
+                return
+            magic, seq, width, height, fmt = FRAME_HEADER.unpack(header)
+            if fmt == FORMAT_ENCODED and magic == FRAME_MAGIC and self.decoder is not None:
+                if not self._receive_encoded(client, seq, length):
+                    return
+                continue
+            shape = self._frame_shape(magic, width, height, fmt)
+            if shape is None:
+                return
+
+            frame = self.mailbox.acquire(shape)
+            if not recv_exact(client, memoryview(frame).cast('B')):
+                self.mailbox.release(frame)
+                return
+            self.mailbox.publish(frame, (seq, fmt))
+            if self.on_frame is not None:
+                self.on_frame()
+
+    # Read the compressed payload into a buffer of its own and queue it for decoding
+    def _receive_encoded(self, client, seq, length):
+        if not recv_exact(client, memoryview(length)):
+            return False
+        size = ENCODED_LENGTH.unpack(length)[0]
+        if not 0 < size <= MAX_ENCODED:
+            print("Frame stream: bad encoded length {}".format(size))
+            return False
+        payload = np.empty(size, dtype=np.uint8)
+        if not recv_exact(client, memoryview(payload)):
+            return False
+        self.decoder.submit(payload, seq)
+        return True
+
+    def _frame_shape(self, magic, width, height, fmt):
+        if magic != FRAME_MAGIC:
+            print("Frame stream: bad magic {!r}".format(magic))
+            return None
+        if not (0 < width <= MAX_DIMENSION and 0 < height <= MAX_DIMENSION):
+            print("Frame stream: bad size {}x{}".format(width, height))
+            return None
+        if fmt == FORMAT_BGR888:
+            return (height, width, 3)
+        if fmt == FORMAT_NATIVE:
+            if self.native_size is not None and (width, height) != tuple(self.native_size):
+                print("Frame stream: native frames must be {}x{}".format(*self.native_size))
+                return None
+            return (height, width, self.native_bytes)
+        print("Frame stream: unknown format {}".format(fmt))
+        return None
+
+
+# Decodes JPEG/PNG frames on a small thread pool (cv2.imdecode releases the GIL)
+# and publishes them to the mailbox as BGR frames. At most `max_pending` frames
+# wait for or are in decoding; more are dropped on arrival. A frame that finishes
+# after a newer one was published is dropped as stale.
+class FrameDecoder(object):
+
+    def __init__(self, mailbox, workers=2, max_pending=None, on_frame=None):
+        self.mailbox = mailbox
+        self.max_pending = max_pending or 2 * workers
+        self.on_frame = on_frame
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.last_seq = None
+        self.decoded = 0
+        self.dropped_busy = 0
+        self.dropped_stale = 0
+        self.failed = 0
+
+    def reset(self):
+        with self.lock:
+            self.last_seq = None
+
+    # Returns False if the frame was dropped because the decoders are busy
+    def submit(self, payload, seq):
+        with self.lock:
+            if self.pending >= self.max_pending:
+                self.dropped_busy += 1
+                return False
+            self.pending += 1
+        self.executor.submit(self._decode, payload, seq)
+        return True
+
+    def _decode(self, payload, seq):
+        try:
+            image = cv2.imdecode(payload, cv2.IMREAD_COLOR)
+            with self.lock:
+                if image is None:
+                    self.failed += 1
+                    return
+                if self.last_seq is not None and not seq_newer(seq, self.last_seq):
+                    self.dropped_stale += 1
+                    return
+                self.last_seq = seq
+                self.decoded += 1
+                self.mailbox.publish(image, (seq, FORMAT_BGR888))
+            if self.on_frame is not None:
+                self.on_frame()
+        except Exception as e:
+            print("Frame decode error: {}".format(str(e)))
+            with self.lock:
+                self.failed += 1
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def summary(self):
+        return "Frames decoded: {}, dropped busy: {}, dropped stale: {}, failed: {}".format(
+            self.decoded, self.dropped_busy, self.dropped_stale, self.failed)
+
+
+# True if 32-bit sequence number `seq` comes after `last`, allowing for wrap-around
+def seq_newer(seq, last):
+    return seq != last and (seq - last) & 0xFFFFFFFF < 0x80000000
+
+def recv_exact(sock, view):
+    received = 0
+    while received < len(view):
+        count = sock.recv_into(view[received:])
+        if not count:
+            return False
+        received += count
+    return True
+
+# Client side: send one frame (a BGR image, or a native-format buffer)
+def send_frame(sock, image, seq, fmt=FORMAT_BGR888):
+    image = np.ascontiguousarray(image)
+    height, width = image.shape[:2]
+    sock.sendall(FRAME_HEADER.pack(FRAME_MAGIC, seq & 0xFFFFFFFF, width, height, fmt))
+    sock.sendall(memoryview(image).cast('B'))
+
+# Client side: compress a BGR image (ext '.jpg' or '.png') and send it
+def send_encoded(sock, image, seq, ext='.jpg', params=()):
+    ok, payload = cv2.imencode(ext, image, list(params))
+    if not ok:
+        raise ValueError("Could not encode frame as {}".format(ext))
+    height, width = image.shape[:2]
+    sock.sendall(FRAME_HEADER.pack(FRAME_MAGIC, seq & 0xFFFFFFFF, width, height, FORMAT_ENCODED) +
+                 ENCODED_LENGTH.pack(len(payload)))
+    sock.sendall(memoryview(payload).cast('B'))
+
+
+# Stream a video file or camera to a projector running the 'stream' scene
+def main():
+    parser = argparse.ArgumentParser(description="Stream frames to the DLP2000 display engine")
+    parser.add_argument('host')
+    parser.add_argument('--port', type=int, default=STREAM_PORT)
+    parser.add_argument('--source', default='0', help="video file, or camera index")
+    parser.add_argument('--width', type=int, default=720)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--encode', choices=['raw', 'jpg', 'png'], default='raw')
+    parser.add_argument('--quality', type=int, default=80, help="JPEG quality")
+    args = parser.parse_args()
+
+    capture = cv2.VideoCapture(int(args.source) if args.source.isdigit() else args.source)
+    sock = socket.create_connection((args.host, args.port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    frame = np.empty((args.height, args.width, 3), dtype=np.uint8)
+    seq = 0
+    try:
+        while True:
+            ok, image = capture.read()
+            if not ok:
+                break
+            cv2.resize(image, (args.width, args.height), dst=frame)
+            if args.encode == 'jpg':
+                send_encoded(sock, frame, seq, '.jpg', [cv2.IMWRITE_JPEG_QUALITY, args.quality])
+            elif args.encode == 'png':
+                send_encoded(sock, frame, seq, '.png', [cv2.IMWRITE_PNG_COMPRESSION, 1])
+            else:
+                send_frame(sock, frame, seq)
+            seq += 1
+    finally:
+        sock.close()
+        capture.release()
+    print("Sent {} frames".format(seq))
+
+if __name__ == "__main__":
+    main()
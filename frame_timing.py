@@ -0,0 +1,72 @@
+import time
+import numpy as np
+
+
+# Per-stage timing of a render loop. Each frame is bracketed by begin() and end();
+# mark(stage) charges the time since the previous mark to `stage`, so a stage
+# marked several times in one frame (e.g. once per dirty region) is summed.
+# The last `window` frames of every stage are kept in a ring for percentiles.
+# Marks outside begin()/end() are ignored, so instrumented code costs one
+# attribute check when no frame is being timed.
+class FrameTimer(object):
+
+    def __init__(self, window=600, clock=time.perf_counter):
+        self.window = window
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        self.stages = []
+        self.samples = {}
+        self.counts = {}
+        self._frame = {}
+        self._start = None
+        self._last = None
+
+    def begin(self):
+        self._frame.clear()
+        self._start = self._last = self.clock()
+
+    def mark(self, stage):
+        if self._last is None:
+            return
+        now = self.clock()
+        self._frame[stage] = self._frame.get(stage, 0.0) + now - self._last
+        self._last = now
+
+    def end(self):
+        if self._start is None:
+            return
+        now = self.clock()
+        for stage, seconds in self._frame.items():
+            self._record(stage, seconds)
+        self._record('total', now - self._start)
+        self._start = self._last = None
+
+    def _record(self, stage, seconds):
+        ring = self.samples.get(stage)
+        if ring is None:
+            ring = self.samples[stage] = np.zeros(self.window)
+            self.counts[stage] = 0
+            self.stages.append(stage)
+        ring[self.counts[stage] % self.window] = seconds
+        self.counts[stage] += 1
+
+    # {stage: {'count', 'p50', 'p95', 'p99', 'max'}} in milliseconds over the window
+    def stats(self):
+        result = {}
+        for stage in list(self.stages):
+            count = self.counts[stage]
+            values = self.samples[stage][:min(count, self.window)] * 1000.0
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            result[stage] = {'count': count, 'p50': float(p50), 'p95': float(p95), 'p99': float(p99),
+                             'max': float(values.max())}
+        return result
+
+    def summary(self):
+        return "Frame timing: " + (format_stats(self.stats()) or "no frames timed")
+
+
+def format_stats(stats):
+    return "; ".join("{} p50 {p50:.2f} p95 {p95:.2f} p99 {p99:.2f} max {max:.2f} ms".format(stage, **values)
+                     for stage, values in stats.items())
@@ -0,0 +1,323 @@
+import cv2
+import numpy as np
+import os
+import stat
+import fcntl
+import mmap
+import struct
+import tempfile
+from pixel_format import BGR_CONVERSIONS, get_converter
+
+FBIOGET_VSCREENINFO = 0x4600
+FBIOPUT_VSCREENINFO = 0x4601
+FBIOGET_FSCREENINFO = 0x4602
+FBIOPAN_DISPLAY = 0x4606
+FBIO_WAITFORVSYNC = 0x40044620
+
+# struct fb_var_screeninfo is 40 __u32 fields
+VAR_SCREENINFO = struct.Struct('40I')
+VAR_FIELD = struct.Struct('I')
+VAR_YRES_VIRTUAL = 3
+VAR_XOFFSET = 4
+VAR_YOFFSET = 5
+# struct fb_fix_screeninfo, native layout (unsigned long differs on 32/64 bit)
+FIX_SCREENINFO = struct.Struct('@16sLIIIIHHHILIIH2H')
+FIX_SCREENINFO_SIZE = 80
+
+DEFAULT_XRES = 720
+DEFAULT_YRES = 480
+DEFAULT_BPP = 16
+
+
+# Long-lived mapping of the framebuffer device. Screen info is queried once and
+# the device is mapped with mmap, so writing a frame is a single in-place copy.
+# A plain file can stand in for /dev/fb0; the geometry then comes from the arguments.
+#
+# With buffers > 1 the virtual height is split into pages: frames are rendered into
+# an offscreen page and shown with FBIOPAN_DISPLAY. If the driver cannot provide
+# the pages or refuses to pan, output falls back to a single buffer.
+class Framebuffer(object):
+
+    def __init__(self, path='/dev/fb0', xres=DEFAULT_XRES, yres=DEFAULT_YRES,
+                 bits_per_pixel=DEFAULT_BPP, buffers=1, converter='opencv'):
+        self.path = path
+        self.map = None
+        # Optional frame_timing.FrameTimer charged with the resize/convert/copy/flip stages
+        self.timer = None
+        self.var_info = None
+        self.fd = self._open(path)
+        try:
+            try:
+                self._query_screen_info()
+            except (IOError, OSError):
+                # Not a framebuffer device (e.g. a regular file used off-target)
+                self._set_screen_info(xres, yres, xres, yres, bits_per_pixel,
+                                      xres * bits_per_pixel // 8)
+                self.red_offset = 11 if bits_per_pixel == 16 else 16
+                self.blue_offset = 0
+
+            if self.xres <= 0 or self.yres <= 0:
+                print("Invalid framebuffer resolution. Using default {}x{}.".format(xres, yres))
+                self._set_screen_info(xres, yres, xres, yres, self.bits_per_pixel,
+                                      xres * self.bits_per_pixel // 8)
+
+            if self.bits_per_pixel not in BGR_CONVERSIONS:
+                raise ValueError("Unsupported bits_per_pixel: {}".format(self.bits_per_pixel))
+
+            if buffers > 1 and self.yres_virtual < self.yres * buffers:
+                self._request_yres_virtual(self.yres * buffers)
+            self.buffers = max(1, min(buffers, self.yres_virtual // self.yres))
+            if self.buffers < buffers:
+                print("Framebuffer provides {} of {} requested buffers".format(self.buffers, buffers))
+
+            self.size = self.line_length * self.yres_virtual
+            if stat.S_ISREG(os.fstat(self.fd).st_mode) and os.fstat(self.fd).st_size < self.size:
+                os.ftruncate(self.fd, self.size)
+
+            self.map = mmap.mmap(self.fd, self.size, mmap.MAP_SHARED,
+                                 mmap.PROT_READ | mmap.PROT_WRITE)
+        except Exception:
+            self.close()
+            raise
+
+        self.bytes_per_pixel = self.bits_per_pixel // 8
+        self.set_converter(converter)
+        self._scaled = None
+        self.wait_for_vsync = True
+
+        # Raw rows of the whole mapping, including any stride padding
+        self.array = np.ndarray((self.yres_virtual, self.line_length), dtype=np.uint8,
+                                buffer=self.map)
+        # One stride-aware pixel view per page, one entry per byte of each pixel
+        self.pages = [np.ndarray((self.yres, self.xres, self.bytes_per_pixel), dtype=np.uint8,
+                                 buffer=self.map, offset=page * self.yres * self.line_length,
+                                 strides=(self.line_length, self.bytes_per_pixel, 1))
+                      for page in range(self.buffers)]
+        self.front = 0
+        # Regions each page is still missing compared to the latest frame
+        self.stale = [[] for page in range(self.buffers)]
+        if self.buffers > 1:
+            try:
+                self._pan(0)
+            except (IOError, OSError) as e:
+                self._single_buffer(e)
+
+        print("Framebuffer info: xres={}, yres={}, bits_per_pixel={}, line_length={}, buffers={}".format(
+            self.xres, self.yres, self.bits_per_pixel, self.line_length, self.buffers))
+
+    # Select the BGR conversion back end by name (see pixel_format.CONVERTERS)
+    def set_converter(self, name):
+        self.converter = get_converter(name, self.bits_per_pixel,
+                                       red_high=self.red_offset > self.blue_offset)
+
+    def _open(self, path):
+        return os.open(path, os.O_RDWR)
+
+    def _query_screen_info(self):
+        var_info = bytearray(VAR_SCREENINFO.size)
+        fcntl.ioctl(self.fd, FBIOGET_VSCREENINFO, var_info, True)
+        fix_info = bytearray(FIX_SCREENINFO_SIZE)
+        fcntl.ioctl(self.fd, FBIOGET_FSCREENINFO, fix_info, True)
+
+        var_fields = VAR_SCREENINFO.unpack(bytes(var_info))
+        xres, yres, xres_virtual, yres_virtual = var_fields[:4]
+        bits_per_pixel = var_fields[6]
+        line_length = FIX_SCREENINFO.unpack_from(bytes(fix_info))[9]
+        self.red_offset = var_fields[8]
+        self.blue_offset = var_fields[14]
+        self.var_info = var_info
+        self._set_screen_info(xres, yres, xres_virtual, yres_virtual, bits_per_pixel,
+                              line_length)
+
+    def _set_screen_info(self, xres, yres, xres_virtual, yres_virtual, bits_per_pixel,
+                         line_length):
+        self.xres = xres
+        self.yres = yres
+        self.xres_virtual = max(xres_virtual, xres)
+        self.yres_virtual = max(yres_virtual, yres)
+        self.bits_per_pixel = bits_per_pixel
+        self.line_length = line_length or xres * bits_per_pixel // 8
+
+    def _request_yres_virtual(self, yres_virtual):
+        if self.var_info is None:
+            return
+        try:
+            var_info = bytearray(self.var_info)
+            VAR_FIELD.pack_into(var_info, VAR_YRES_VIRTUAL * 4, yres_virtual)
+            fcntl.ioctl(self.fd, FBIOPUT_VSCREENINFO, var_info, True)
+            self._query_screen_info()
+        except (IOError, OSError) as e:
+            print("Framebuffer cannot grow yres_virtual to {}: {}".format(yres_virtual, e))
+
+    def _pan(self, page):
+        var_info = bytearray(self.var_info)
+        VAR_FIELD.pack_into(var_info, VAR_XOFFSET * 4, 0)
+        VAR_FIELD.pack_into(var_info, VAR_YOFFSET * 4, page * self.yres)
+        fcntl.ioctl(self.fd, FBIOPAN_DISPLAY, var_info, True)
+        if self.wait_for_vsync:
+            try:
+                fcntl.ioctl(self.fd, FBIO_WAITFORVSYNC, struct.pack('I', 0))
+            except (IOError, OSError):
+                self.wait_for_vsync = False
+
+    def _single_buffer(self, error):
+        print("FBIOPAN_DISPLAY failed, using a single buffer: {}".format(error))
+        self.pages = [self.pages[0]]
+        self.stale = [[]]
+        self.buffers = 1
+        self.front = 0
+
+    # Page the next frame should be rendered into
+    def back_buffer(self):
+        return self.pages[(self.front + 1) % self.buffers]
+
+    # Show the back buffer. Falls back to single buffering if the driver refuses to pan.
+    def flip(self):
+        if self.buffers == 1:
+            return
+        back = (self.front + 1) % self.buffers
+        try:
+            self._pan(back)
+        except (IOError, OSError) as e:
+            # Page 0 is what the panel scans out without panning
+            if back != 0:
+                np.copyto(self.pages[0], self.pages[back])
+            self._single_buffer(e)
+            return
+        self.front = back
+        self._mark('flip')
+
+    def write(self, image):
+        self.convert_into(image, self.back_buffer())
+        self._mark_written([(0, 0, self.xres, self.yres)])
+        self.flip()
+
+    # Push only the given (x0, y0, x1, y1) regions of a full-size frame. With several
+    # pages, regions written to the other pages since this one was shown are included.
+    def write_regions(self, image, regions):
+        if image.shape[:2] != (self.yres, self.xres):
+            self.write(image)
+            return
+        back = self.back_buffer()
+        index = (self.front + 1) % self.buffers
+        for x0, y0, x1, y1 in self.stale[index] + list(regions):
+            self.convert_into(image[y0:y1, x0:x1], back[y0:y1, x0:x1], (x0, y0))
+        self._mark_written(regions)
+        self.flip()
+
+    # Copy a cached layer already in the framebuffer pixel format (see layers.StaticLayer)
+    # into the back page, then convert only the given regions of `image` on top of it.
+    def write_over(self, packed, image=None, regions=()):
+        back = self.back_buffer()
+        np.copyto(back, packed)
+        self._mark('copy')
+        if image is not None:
+            for x0, y0, x1, y1 in regions:
+                self.convert_into(image[y0:y1, x0:x1], back[y0:y1, x0:x1], (x0, y0))
+        self._mark_written([(0, 0, self.xres, self.yres)])
+        self.flip()
+
+    # Show a frame already in the framebuffer pixel format (e.g. a streamed FORMAT_NATIVE frame)
+    def write_native(self, frame):
+        self.write_over(frame)
+
+    def _mark_written(self, regions):
+        index = (self.front + 1) % self.buffers
+        self.stale[index] = []
+        for page in range(self.buffers):
+            if page == index:
+                continue
+            stale = self.stale[page] + list(regions)
+            if len(stale) > 32:
+                # Too fragmented, repaint the whole page next time
+                stale = [(0, 0, self.xres, self.yres)]
+            self.stale[page] = stale
+
+    # Convert a BGR frame straight into `dst` (a stride-aware view of the mapping),
+    # `origin` being where dst sits on the screen. Frames already in the framebuffer
+    # pixel layout are copied unchanged.
+    def convert_into(self, image, dst, origin=(0, 0)):
+        if image.shape[:2] != dst.shape[:2]:
+            image = self._resize(image, dst.shape[1], dst.shape[0])
+            self._mark('resize')
+
+        if image.ndim == 3 and image.shape[2] == 3:
+            self.converter(image, dst, origin)
+        else:
+            np.copyto(dst, image.reshape(dst.shape[:2] + (-1,)))
+        self._mark('convert')
+
+    def _mark(self, stage):
+        if self.timer is not None:
+            self.timer.mark(stage)
+
+    def _resize(self, image, width, height):
+        # Keep one scratch buffer per input layout instead of allocating per frame
+        shape = (height, width) + image.shape[2:]
+        if self._scaled is None or self._scaled.shape != shape or self._scaled.dtype != image.dtype:
+            self._scaled = np.empty(shape, dtype=image.dtype)
+        cv2.resize(image, (width, height), dst=self._scaled)
+        return self._scaled
+
+    def clear(self):
+        self.array.fill(0)
+
+    def close(self):
+        if self.map is not None:
+            self.array = None
+            self.pages = None
+            self.map.close()
+            self.map = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Framebuffer without a panel: backed by an unlinked temporary file, with the
+# screen info and pan ioctls simulated so page flipping can be exercised off-target.
+# `max_buffers` is how many pages the simulated driver can provide and
+# `supports_pan=False` mimics a driver that rejects FBIOPAN_DISPLAY.
+class SimulatedFramebuffer(Framebuffer):
+
+    def __init__(self, xres=DEFAULT_XRES, yres=DEFAULT_YRES, bits_per_pixel=DEFAULT_BPP,
+                 buffers=1, max_buffers=3, supports_pan=True, line_length=None, converter='opencv'):
+        self.sim_xres = xres
+        self.sim_yres = yres
+        self.sim_bits_per_pixel = bits_per_pixel
+        self.sim_line_length = line_length or xres * bits_per_pixel // 8
+        self.sim_yres_virtual = yres
+        self.max_buffers = max_buffers
+        self.supports_pan = supports_pan
+        self.pan_history = []
+        Framebuffer.__init__(self, None, xres, yres, bits_per_pixel, buffers, converter)
+
+    def _open(self, path):
+        fd, temp_path = tempfile.mkstemp(prefix='simfb')
+        os.unlink(temp_path)
+        return fd
+
+    def _query_screen_info(self):
+        self.red_offset = 11 if self.sim_bits_per_pixel == 16 else 16
+        self.blue_offset = 0
+        self.var_info = bytearray(VAR_SCREENINFO.size)
+        self._set_screen_info(self.sim_xres, self.sim_yres, self.sim_xres, self.sim_yres_virtual,
+                              self.sim_bits_per_pixel, self.sim_line_length)
+
+    def _request_yres_virtual(self, yres_virtual):
+        self.sim_yres_virtual = min(yres_virtual, self.sim_yres * self.max_buffers)
+        self._query_screen_info()
+
+    def _pan(self, page):
+        if not self.supports_pan:
+            raise IOError("FBIOPAN_DISPLAY not supported")
+        self.pan_history.append(page)
+
+    # Page the simulated panel is currently scanning out
+    def displayed(self):
+        return self.pages[self.front]
@@ -0,0 +1,116 @@
+import ctypes
+import fcntl
+import os
+
+I2C_SLAVE = 0x0703
+I2C_RDWR = 0x0707
+# Kernel limit on messages per I2C_RDWR transaction
+I2C_RDWR_MAX_MSGS = 42
+
+# DPP2607 on the DLP2000 EVM cape
+DPP2607_I2C_BUS = 2
+DPP2607_I2C_ADDR = 0x1b
+
+# Register block writes issued around display bring-up: (register, data bytes).
+# Same as "i2cset -y 2 0x1b 0x0b 0x00 0x00 0x00 0x00 i" and "... 0x0c ... 0x09 i".
+DISPLAY_I2C_WRITES = [
+    (0x0b, [0x00, 0x00, 0x00, 0x00]),
+    (0x0c, [0x00, 0x00, 0x00, 0x09]),
+]
+
+
+class I2CMsg(ctypes.Structure):
+    _fields_ = [('addr', ctypes.c_uint16),
+                ('flags', ctypes.c_uint16),
+                ('len', ctypes.c_uint16),
+                ('buf', ctypes.POINTER(ctypes.c_uint8))]
+
+
+class I2CRdwrData(ctypes.Structure):
+    _fields_ = [('msgs', ctypes.POINTER(I2CMsg)),
+                ('nmsgs', ctypes.c_uint32)]
+
+
+# In-process access to /dev/i2c-N. write_registers() sends several register block
+# writes as the messages of one I2C_RDWR transaction instead of one process each.
+class I2CBus(object):
+
+    def __init__(self, bus=DPP2607_I2C_BUS):
+        self.bus = bus
+        self.fd = os.open('/dev/i2c-{}'.format(bus), os.O_RDWR)
+
+    # writes: list of (register, data bytes), sent to the device at `addr`
+    def write_registers(self, addr, writes):
+        writes = list(writes)
+        for start in range(0, len(writes), I2C_RDWR_MAX_MSGS):
+            chunk = writes[start:start + I2C_RDWR_MAX_MSGS]
+            msgs = (I2CMsg * len(chunk))()
+            buffers = []
+            for msg, (reg, data) in zip(msgs, chunk):
+                payload = bytes([reg]) + bytes(data)
+                buf = (ctypes.c_uint8 * len(payload)).from_buffer_copy(payload)
+                buffers.append(buf)
+                msg.addr = addr
+                msg.flags = 0
+                msg.len = len(payload)
+                msg.buf = ctypes.cast(buf, ctypes.POINTER(ctypes.c_uint8))
+            request = I2CRdwrData(msgs, len(chunk))
+            fcntl.ioctl(self.fd, I2C_RDWR, request)
+
+    def write_register(self, addr, reg, data):
+        self.write_registers(addr, [(reg, data)])
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+# Stand-in bus for tests and off-target runs: records every transaction and keeps
+# the last bytes written to each register. Set `fail` to make writes raise IOError.
+class FakeI2CBus(object):
+
+    def __init__(self, bus=DPP2607_I2C_BUS):
+        self.bus = bus
+        self.transactions = []
+        self.registers = {}
+        self.fail = False
+
+    def write_registers(self, addr, writes):
+        if self.fail:
+            raise IOError("simulated I2C failure")
+        writes = [(reg, bytes(data)) for reg, data in writes]
+        self.transactions.append((addr, writes))
+        for reg, data in writes:
+            self.registers[(addr, reg)] = data
+
+    def write_register(self, addr, reg, data):
+        self.write_registers(addr, [(reg, data)])
+
+    def close(self):
+        pass
+
+
+_default_bus = None
+
+# Bus used by run_i2c_commands; opened once on first use unless set_default_bus() was called
+def default_bus():
+    global _default_bus
+    if _default_bus is None:
+        _default_bus = I2CBus(DPP2607_I2C_BUS)
+    return _default_bus
+
+def set_default_bus(bus):
+    global _default_bus
+    _default_bus = bus
+
+def run_i2c_commands(bus=None):
+    try:
+        if bus is None:
+            bus = default_bus()
+        bus.write_registers(DPP2607_I2C_ADDR, DISPLAY_I2C_WRITES)
+        print("Successfully wrote I2C registers: {}".format(
+            ", ".join("0x{:02x}".format(reg) for reg, data in DISPLAY_I2C_WRITES)))
+    except Exception as e:
+        print("Exception while writing I2C registers on bus {}".format(DPP2607_I2C_BUS))
+        print("Exception details: {}".format(str(e)))
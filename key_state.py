@@ -0,0 +1,54 @@
+import collections
+import threading
+from protocol import NUM_KEYS, apply_ops, mask_to_keys
+
+
+# Keyboard state as an integer key mask (bit 0 = key 1) plus the green screen flag,
+# with a version number that increases on every change. Writers hold the lock only
+# for the update itself; readers take snapshot(), a single attribute read, and never
+# block. `on_change` is called after each change, outside the lock.
+class KeyState(object):
+
+    def __init__(self, num_keys=NUM_KEYS, history=64, on_change=None):
+        self.num_keys = num_keys
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        # (version, mask, green), replaced as a whole so reads are atomic
+        self._state = (0, 0, False)
+        self._history = collections.deque([self._state], maxlen=history)
+
+    def snapshot(self):
+        return self._state
+
+    @property
+    def version(self):
+        return self._state[0]
+
+    def active_keys(self):
+        return mask_to_keys(self._state[1])
+
+    # Apply protocol operations (see protocol.apply_ops) as one atomic change.
+    # Returns the resulting (version, mask, green).
+    def apply(self, ops):
+        with self._lock:
+            version, mask, green = self._state
+            new_mask, new_green = apply_ops(ops, mask, green)
+            changed = (new_mask, new_green) != (mask, green)
+            if changed:
+                self._state = (version + 1, new_mask, new_green)
+                self._history.append(self._state)
+            state = self._state
+        if changed and self.on_change is not None:
+            self.on_change()
+        return state
+
+    # Keys whose state differs between `version` and now, as a mask, plus whether
+    # the green screen flag changed. Versions older than the history report every key.
+    def changes_since(self, version):
+        current = self._state
+        if version == current[0]:
+            return 0, False
+        for old_version, old_mask, old_green in self._history:
+            if old_version == version:
+                return old_mask ^ current[1], old_green != current[2]
+        return (1 << self.num_keys) - 1, True
@@ -0,0 +1,260 @@
+import cv2
+import numpy as np
+from layers import StaticLayer
+
+# Corner circles stick out of the key rectangle by their radius
+KEY_MARGIN = 6
+
+
+def draw_rectangle(image, top_left, bottom_right, text, is_active=False):
+    color = (0, 0, 255) if is_active else (0, 255, 0)
+    cv2.rectangle(image, top_left, bottom_right, color, 2)
+
+    cv2.circle(image, top_left, 5, color, -1)
+    cv2.circle(image, bottom_right, 5, color, -1)
+    cv2.circle(image, (top_left[0], bottom_right[1]), 5, color, -1)
+    cv2.circle(image, (bottom_right[0], top_left[1]), 5, color, -1)
+
+    center_x = (top_left[0] + bottom_right[0]) // 2
+    center_y = (top_left[1] + bottom_right[1]) // 2
+
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    font_scale = 0.5
+    font_thickness = 1
+    text_size = cv2.getTextSize(text, font, font_scale, font_thickness)[0]
+
+    text_x = int(center_x - text_size[0] // 2)
+    text_y = int(center_y + text_size[1] // 2)
+
+    if is_active:
+        text_color = (255, 255, 255)
+    else:
+        text_color = (0, 0, 0)
+
+    cv2.putText(image, text, (text_x, text_y), font, font_scale, text_color, font_thickness)
+
+    return image
+
+# A key as opencv_keyboard.py draws it: green outline and white label, no corners or state
+def draw_plain_key(image, top_left, bottom_right, text):
+    cv2.rectangle(image, top_left, bottom_right, (0, 255, 0), 2)
+
+    center_x = (top_left[0] + bottom_right[0]) // 2
+    center_y = (top_left[1] + bottom_right[1]) // 2
+
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    font_scale = 0.5
+    font_thickness = 1
+    text_size = cv2.getTextSize(text, font, font_scale, font_thickness)[0]
+
+    text_x = center_x - text_size[0] // 2
+    text_y = center_y + text_size[1] // 2
+
+    cv2.putText(image, text, (text_x, text_y), font, font_scale, (255, 255, 255), font_thickness)
+
+    return image
+
+# Key labels and rectangles as (label, top_left, bottom_right), numbered from 1.
+# `scale` shrinks the grid, which then starts at `origin` instead of the top left.
+def key_rectangles(img_width, img_height, rows=2, cols=5, scale=1.0, origin=(0, 0)):
+    rect_width = int(scale*img_width // (cols + 1))
+    rect_height = int(scale*img_height // (rows + 2))
+    spacing_x = rect_width // 5
+    spacing_y = rect_height // 4
+
+    keys = []
+    idx = 1
+
+    for row in range(rows):
+        for col in range(cols):
+            top_left_x = origin[0] + (col + 1) * spacing_x + col * rect_width
+            top_left_y = origin[1] + (row + 1) * spacing_y + row * rect_height
+            bottom_right_x = top_left_x + rect_width
+            bottom_right_y = top_left_y + rect_height
+
+            keys.append((str(idx), (top_left_x, top_left_y), (bottom_right_x, bottom_right_y)))
+            idx += 1
+    return keys
+
+# Region (x0, y0, x1, y1) touched when drawing a key, clipped to the image
+def key_region(top_left, bottom_right, img_width, img_height):
+    return (max(top_left[0] - KEY_MARGIN, 0), max(top_left[1] - KEY_MARGIN, 0),
+            min(bottom_right[0] + KEY_MARGIN + 1, img_width),
+            min(bottom_right[1] + KEY_MARGIN + 1, img_height))
+
+# Which key lies under each point, for batches of points (e.g. tracked fingertips)
+# in screen coordinates. The key rectangles, edges included, are rasterized once
+# into a label table with a one pixel border of "no key", so a lookup is one
+# clip and one fancy index per batch, independent of the number of keys.
+class KeyLayout(object):
+
+    def __init__(self, keys, width, height):
+        self.keys = [(text, top_left, bottom_right) for text, top_left, bottom_right in keys]
+        self.width = width
+        self.height = height
+        self.labels = np.full((height + 2, width + 2), -1, dtype=np.int16)
+        for index, (text, top_left, bottom_right) in enumerate(self.keys):
+            x0, y0 = max(top_left[0], 0), max(top_left[1], 0)
+            x1, y1 = min(bottom_right[0], width - 1), min(bottom_right[1], height - 1)
+            self.labels[y0 + 1:y1 + 2, x0 + 1:x1 + 2] = index
+
+    # Key index under each (x, y) of `points` (shape (n, 2)), -1 where there is none
+    def hit(self, points):
+        points = np.asarray(points)
+        if points.size == 0:
+            return np.empty(0, dtype=np.int16)
+        points = points.reshape(-1, 2)
+        xs = np.clip(np.floor(points[:, 0]).astype(np.intp), -1, self.width) + 1
+        ys = np.clip(np.floor(points[:, 1]).astype(np.intp), -1, self.height) + 1
+        return self.labels[ys, xs]
+
+    # Key mask (bit 0 = first key) of the keys under any of `points`
+    def mask(self, points):
+        hits = self.hit(points)
+        hits = hits[hits >= 0]
+        if hits.size == 0:
+            return 0
+        return int(np.bitwise_or.reduce(np.left_shift(1, hits.astype(np.int64))))
+
+    def key_at(self, x, y):
+        index = int(self.hit([(x, y)])[0])
+        return self.keys[index][0] if index >= 0 else None
+
+
+def draw_grid_of_rectangles(image, active_mask, rows=2, cols=5):
+    img_height, img_width, _ = image.shape
+
+    keys = key_rectangles(img_width, img_height, rows, cols)
+    for index, (text, top_left, bottom_right) in enumerate(keys):
+        is_active = bool(active_mask >> index & 1)
+        image = draw_rectangle(image, top_left, bottom_right, text, is_active)
+    return image
+
+def add_click_text(image):
+    img_height, img_width, _ = image.shape
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    font_scale = 1
+    font_thickness = 2
+    text = "Click"
+    text_size = cv2.getTextSize(text, font, font_scale, font_thickness)[0]
+    text_x = (img_width - text_size[0]) // 2
+    text_y = img_height - 20
+    cv2.putText(image, text, (text_x, text_y), font, font_scale, (255, 255, 255), font_thickness)
+    return image
+
+def draw_border_and_markers(image):
+    height, width = image.shape[:2]
+    border_color = (255, 0, 0)
+    marker_color = (0, 255, 0)
+    thickness = 2
+    marker_size = 20
+
+    cv2.rectangle(image, (0, 0), (width-1, height-1), border_color, thickness)
+
+    cv2.rectangle(image, (0, 0), (marker_size, marker_size), marker_color, -1)
+    cv2.rectangle(image, (width-marker_size, 0), (width, marker_size), marker_color, -1)
+    cv2.rectangle(image, (0, height-marker_size), (marker_size, height), marker_color, -1)
+    cv2.rectangle(image, (width-marker_size, height-marker_size), (width, height), marker_color, -1)
+
+    return image
+
+# The whole opencv_keyboard.py frame: plain keys, then the 'Click' text, border and markers
+def draw_plain_keyboard(image, rows=2, cols=5):
+    img_height, img_width = image.shape[:2]
+    for text, top_left, bottom_right in key_rectangles(img_width, img_height, rows, cols):
+        draw_plain_key(image, top_left, bottom_right, text)
+    return draw_keyboard_background(image)
+
+def draw_keyboard_background(image):
+    add_click_text(image)
+    draw_border_and_markers(image)
+    return image
+
+
+# Every key pre-rendered in both states, so a frame is composed by slice
+# assignment instead of OpenCV drawing calls. As the keyboard has always been
+# drawn, keys go on a blank canvas with the background (`draw_background`:
+# border, markers, text) drawn over them, so keys reaching the screen edge do
+# not cover the border.
+class KeyAtlas(object):
+
+    def __init__(self, keys, background, draw_background):
+        self.tiles = {}
+        canvas = background.copy()
+        for text, top_left, bottom_right, region in keys:
+            x0, y0, x1, y1 = region
+            for is_active in (False, True):
+                canvas[y0:y1, x0:x1] = 0
+                draw_rectangle(canvas, top_left, bottom_right, text, is_active)
+                draw_background(canvas)
+                self.tiles[(text, is_active)] = canvas[y0:y1, x0:x1].copy()
+                canvas[y0:y1, x0:x1] = background[y0:y1, x0:x1]
+
+    def blit(self, frame, text, region, is_active):
+        x0, y0, x1, y1 = region
+        frame[y0:y1, x0:x1] = self.tiles[(text, is_active)]
+
+
+# Keeps the keyboard frame between ticks and repaints only the keys whose state
+# changed since the last render. render() returns the dirty regions to push.
+class KeyboardRenderer(object):
+
+    def __init__(self, width=720, height=480, rows=2, cols=5):
+        self.width = width
+        self.height = height
+        self.rows = rows
+        self.cols = cols
+        self.frame = np.zeros((height, width, 3), dtype=np.uint8)
+        self.background = StaticLayer(draw_keyboard_background)
+        self.keys = []
+        self.layout = None
+        self.atlas = None
+        self.atlas_version = None
+        self.drawn_mask = None
+        self.drawn_version = None
+        self.set_layout(rows, cols)
+
+    def set_layout(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        rectangles = key_rectangles(self.width, self.height, rows, cols)
+        self.keys = [(text, top_left, bottom_right,
+                      key_region(top_left, bottom_right, self.width, self.height))
+                     for text, top_left, bottom_right in rectangles]
+        # Hit testing for the keys as drawn
+        self.layout = KeyLayout(rectangles, self.width, self.height)
+        self.atlas = None
+        self.invalidate()
+
+    # Force a full repaint on the next render (e.g. after something else used the screen)
+    def invalidate(self):
+        self.drawn_mask = None
+        self.drawn_version = None
+
+    # Render the keys active in `active_mask` (bit 0 = first key). When the caller
+    # passes the key state version, an unchanged version returns immediately.
+    def render(self, active_mask, version=None):
+        if version is not None and version == self.drawn_version:
+            return []
+
+        background = self.background.get(self.width, self.height)
+        if self.atlas is None or self.atlas_version != self.background.version:
+            self.atlas = KeyAtlas(self.keys, background, self.background.draw)
+            self.atlas_version = self.background.version
+            self.invalidate()
+
+        if self.drawn_mask is None:
+            np.copyto(self.frame, background)
+            for index, (text, top_left, bottom_right, region) in enumerate(self.keys):
+                self.atlas.blit(self.frame, text, region, bool(active_mask >> index & 1))
+            dirty = [(0, 0, self.width, self.height)]
+        else:
+            dirty = []
+            changed = active_mask ^ self.drawn_mask
+            for index, (text, top_left, bottom_right, region) in enumerate(self.keys):
+                if changed >> index & 1:
+                    self.atlas.blit(self.frame, text, region, bool(active_mask >> index & 1))
+                    dirty.append(region)
+        self.drawn_mask = active_mask
+        self.drawn_version = version
+        return dirty
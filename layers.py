@@ -0,0 +1,48 @@
+import numpy as np
+
+
+# Content that is identical every frame, rasterized once by draw(image, **params)
+# and reused until the resolution or one of the params changes. packed() keeps a
+# copy already converted to the framebuffer pixel format.
+class StaticLayer(object):
+
+    def __init__(self, draw):
+        self.draw = draw
+        self.key = None
+        self.image = None
+        self.version = 0
+        self._packed = None
+        self._packed_key = None
+
+    def get(self, width, height, **params):
+        key = (width, height, tuple(sorted(params.items())))
+        if key != self.key:
+            self.image = np.zeros((height, width, 3), dtype=np.uint8)
+            self.draw(self.image, **params)
+            self.key = key
+            self.version += 1
+        return self.image
+
+    # The layer as the framebuffer stores it; get() must have been called first
+    def packed(self, fb):
+        key = (self.version, id(fb), fb.pages[0].shape)
+        if key != self._packed_key:
+            self._packed = np.empty(fb.pages[0].shape, dtype=np.uint8)
+            fb.convert_into(self.image, self._packed)
+            self._packed_key = key
+        return self._packed
+
+    def invalidate(self):
+        self.key = None
+
+
+# Bounding box (x0, y0, x1, y1) of a filled circle, clipped to the image
+def circle_region(center, radius, width, height):
+    return (max(center[0] - radius - 1, 0), max(center[1] - radius - 1, 0),
+            min(center[0] + radius + 2, width), min(center[1] + radius + 2, height))
+
+# Bounding box of text drawn with cv2.putText at `origin` (bottom-left of the text)
+def text_region(origin, text_size, baseline, thickness, width, height):
+    return (max(origin[0] - thickness, 0), max(origin[1] - text_size[1] - thickness, 0),
+            min(origin[0] + text_size[0] + thickness, width),
+            min(origin[1] + baseline + thickness, height))
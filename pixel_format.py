@@ -0,0 +1,135 @@
+import cv2
+import numpy as np
+
+# bits_per_pixel -> (cvtColor code for red in the high bits, code for red in the low bits)
+# None means the BGR frame can be copied as is.
+BGR_CONVERSIONS = {
+    16: (cv2.COLOR_BGR2BGR565, cv2.COLOR_RGB2BGR565),
+    24: (None, cv2.COLOR_BGR2RGB),
+    32: (cv2.COLOR_BGR2BGRA, cv2.COLOR_BGR2RGBA),
+}
+
+# 4x4 ordered dither (Bayer) thresholds, 0..15
+BAYER_4X4 = np.array([[0, 8, 2, 10],
+                      [12, 4, 14, 6],
+                      [3, 11, 1, 9],
+                      [15, 7, 13, 5]], dtype=np.int32)
+
+
+# Converters write a BGR frame into `dst`, a (height, width, bytes_per_pixel) uint8
+# view of the framebuffer that may have padded rows. `origin` is the position of
+# `dst` on the screen, used to keep the dither pattern aligned across regions.
+
+class OpenCVConverter(object):
+    name = 'opencv'
+
+    def __init__(self, bits_per_pixel=16, red_high=True):
+        if bits_per_pixel not in BGR_CONVERSIONS:
+            raise ValueError("Unsupported bits_per_pixel: {}".format(bits_per_pixel))
+        high_code, low_code = BGR_CONVERSIONS[bits_per_pixel]
+        self.code = high_code if red_high else low_code
+
+    def __call__(self, image, dst, origin=(0, 0)):
+        if self.code is None:
+            np.copyto(dst, image)
+        else:
+            cv2.cvtColor(image, self.code, dst=dst)
+
+
+# RGB565 packing with NumPy from precomputed uint16 tables that map channel values
+# to their shifted 5/6-bit fields. Blue and green share one 64K-entry table indexed
+# by the two adjacent bytes of each BGR pixel read as a little-endian uint16, so a
+# pixel costs two lookups and one OR.
+class LUTConverter(object):
+    name = 'numpy'
+
+    def __init__(self, bits_per_pixel=16, red_high=True):
+        if bits_per_pixel != 16:
+            raise ValueError("{} converter only supports 16 bits_per_pixel".format(self.name))
+        red_shift, blue_shift = (11, 0) if red_high else (0, 11)
+        # Channel order of the BGR input: blue, green, red
+        self.shifts = (blue_shift, 5, red_shift)
+        self.bits = (5, 6, 5)
+        self.luts = self._build_luts()
+        self._scratch = None
+
+    def _build_luts(self):
+        values = np.arange(256, dtype=np.uint16)
+        blue, green, red = [((values >> (8 - bits)) << shift).astype(np.uint16)
+                            for bits, shift in zip(self.bits, self.shifts)]
+        blue_green = (green[:, None] | blue[None, :]).ravel()
+        return [blue_green, red]
+
+    def _scratch_for(self, shape):
+        if self._scratch is None or self._scratch.shape != shape:
+            self._scratch = np.empty(shape, dtype=np.uint16)
+        return self._scratch
+
+    def __call__(self, image, dst, origin=(0, 0)):
+        out = dst.view(np.uint16)[..., 0]
+        scratch = self._scratch_for(out.shape)
+        blue_green = image[..., 0:2].view('<u2')[..., 0]
+        np.take(self.luts[0], blue_green, out=out, mode='clip')
+        np.take(self.luts[1], image[..., 2], out=scratch, mode='clip')
+        np.bitwise_or(out, scratch, out=out)
+
+
+# LUTConverter with 4x4 ordered dithering to hide RGB565 banding. The tables are
+# indexed by (Bayer cell, value), flattened so a lookup stays a single np.take.
+class DitherConverter(LUTConverter):
+    name = 'dither'
+
+    def __init__(self, bits_per_pixel=16, red_high=True):
+        LUTConverter.__init__(self, bits_per_pixel, red_high)
+        self._cells = None
+        self._cells_key = None
+        self._index = None
+
+    def _build_luts(self):
+        values = np.arange(256, dtype=np.int32)
+        thresholds = BAYER_4X4.reshape(16, 1)
+        luts = []
+        for bits, shift in zip(self.bits, self.shifts):
+            step = 1 << (8 - bits)
+            # Spread each quantization step across the 16 thresholds
+            biased = values + (thresholds * step) // 16
+            quantized = np.clip(biased, 0, 255) >> (8 - bits)
+            luts.append((quantized << shift).astype(np.uint16).ravel())
+        return luts
+
+    def _cells_for(self, shape, origin):
+        key = (shape, origin[0] % 4, origin[1] % 4)
+        if key != self._cells_key:
+            height, width = shape
+            rows = (np.arange(height) + origin[1]) % 4
+            cols = (np.arange(width) + origin[0]) % 4
+            self._cells = (BAYER_4X4.shape[1] * rows[:, None] + cols[None, :]).astype(np.int32) * 256
+            self._index = np.empty(shape, dtype=np.int32)
+            self._cells_key = key
+        return self._cells
+
+    def __call__(self, image, dst, origin=(0, 0)):
+        out = dst.view(np.uint16)[..., 0]
+        scratch = self._scratch_for(out.shape)
+        cells = self._cells_for(out.shape, origin)
+        index = self._index
+        for channel in (0, 1, 2):
+            np.add(cells, image[..., channel], out=index)
+            if channel == 0:
+                np.take(self.luts[channel], index, out=out, mode='clip')
+            else:
+                np.take(self.luts[channel], index, out=scratch, mode='clip')
+                np.bitwise_or(out, scratch, out=out)
+
+
+CONVERTERS = {
+    OpenCVConverter.name: OpenCVConverter,
+    LUTConverter.name: LUTConverter,
+    DitherConverter.name: DitherConverter,
+}
+
+def get_converter(name, bits_per_pixel=16, red_high=True):
+    if name not in CONVERTERS:
+        raise ValueError("Unknown pixel converter '{}', expected one of {}".format(
+            name, ", ".join(sorted(CONVERTERS))))
+    return CONVERTERS[name](bits_per_pixel, red_high)
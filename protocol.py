@@ -0,0 +1,241 @@
+import json
+import struct
+from frame_timing import format_stats
+
+# Keyboard control protocol.
+#
+# Text frames are newline-terminated lines, optionally prefixed with "#<seq> " so
+# replies can be matched to pipelined requests. A line holds one or more
+# operations separated by ';', applied together as a batch:
+#
+#   SET 1,3        CLEAR 2        TOGGLE 4,5      STATE 1,2,3 (absolute, empty = none)
+#   GREEN ON|OFF|TOGGLE           GET            STATS          SCENE <name>
+#
+# For compatibility a bare "0" toggles green screen and "1".."10" toggles a key.
+# Replies are "OK [<seq>] <active keys> <GREEN ON|OFF>" or "ERR [<seq>] <reason>".
+# A line containing STATS is answered with "STATS [<seq>] <stage> p50 .. ms; ..."
+# (frame timing) instead; its other operations are still applied.
+#
+# Binary frames start with MAGIC (never the first byte of a text line):
+#
+#   header  >BBIH  magic, op, seq, payload length
+#   SET/CLEAR/TOGGLE/STATE payload: >H key mask (bit 0 = key 1)
+#   GREEN payload: B (0 off, 1 on, 2 toggle); GET, STATS: empty; SCENE: name (UTF-8)
+#   BATCH payload: repeated >BH (op, argument)
+#
+# and are answered with ACK (payload >HB: key mask, green) or NAK (payload: reason);
+# requests containing STATS with STATS_REPLY (payload: frame timing as JSON).
+
+MAGIC = 0xD2
+HEADER = struct.Struct('>BBIH')
+BATCH_ENTRY = struct.Struct('>BH')
+MASK = struct.Struct('>H')
+ACK_PAYLOAD = struct.Struct('>HB')
+
+OP_SET = 1
+OP_CLEAR = 2
+OP_TOGGLE = 3
+OP_STATE = 4
+OP_GREEN = 5
+OP_GET = 6
+OP_BATCH = 7
+OP_STATS = 8
+OP_SCENE = 9
+OP_ACK = 0x80
+OP_NAK = 0x81
+OP_STATS_REPLY = 0x82
+
+GREEN_OFF = 0
+GREEN_ON = 1
+GREEN_TOGGLE = 2
+GREEN_VALUES = (GREEN_OFF, GREEN_ON, GREEN_TOGGLE)
+
+NUM_KEYS = 10
+MAX_LINE = 1024
+
+TEXT_OPS = {'SET': OP_SET, 'CLEAR': OP_CLEAR, 'TOGGLE': OP_TOGGLE, 'STATE': OP_STATE,
+            'GREEN': OP_GREEN, 'GET': OP_GET, 'STATS': OP_STATS,
+            'SCENE': OP_SCENE}
+GREEN_ARGS = {'OFF': GREEN_OFF, 'ON': GREEN_ON, 'TOGGLE': GREEN_TOGGLE}
+
+
+class ProtocolError(Exception):
+    pass
+
+
+# A decoded request: `ops` is a list of (op, argument) applied as one batch,
+# `error` is set instead when the request could not be parsed.
+class Command(object):
+
+    def __init__(self, seq, ops, binary, error=None):
+        self.seq = seq
+        self.ops = ops
+        self.binary = binary
+        self.error = error
+
+
+def keys_to_mask(keys):
+    mask = 0
+    for key in keys:
+        key = int(key)
+        if not 1 <= key <= NUM_KEYS:
+            raise ProtocolError("key out of range: {}".format(key))
+        mask |= 1 << (key - 1)
+    return mask
+
+def mask_to_keys(mask):
+    return [key for key in range(1, NUM_KEYS + 1) if mask & (1 << (key - 1))]
+
+def parse_text(line):
+    seq = None
+    if line.startswith('#'):
+        seq_text, _, line = line[1:].partition(' ')
+        try:
+            seq = int(seq_text)
+        except ValueError:
+            return Command(None, [], False, "bad sequence number")
+    line = line.strip()
+
+    try:
+        if line.isdigit():
+            key = int(line)
+            if key == 0:
+                return Command(seq, [(OP_GREEN, GREEN_TOGGLE)], False)
+            return Command(seq, [(OP_TOGGLE, keys_to_mask([key]))], False)
+
+        ops = []
+        for part in line.split(';'):
+            words = part.split(None, 1)
+            if not words:
+                continue
+            name = words[0].upper()
+            arg = words[1].strip() if len(words) > 1 else ''
+            if name not in TEXT_OPS:
+                raise ProtocolError("unknown command: {}".format(words[0]))
+            op = TEXT_OPS[name]
+            if op == OP_GREEN:
+                if arg.upper() not in GREEN_ARGS:
+                    raise ProtocolError("GREEN expects ON, OFF or TOGGLE")
+                ops.append((op, GREEN_ARGS[arg.upper()]))
+            elif op in (OP_GET, OP_STATS):
+                ops.append((op, 0))
+            elif op == OP_SCENE:
+                if not arg:
+                    raise ProtocolError("SCENE expects a scene name")
+                ops.append((op, arg))
+            else:
+                keys = [k for k in arg.replace(',', ' ').split()]
+                ops.append((op, keys_to_mask(keys)))
+        if not ops:
+            raise ProtocolError("empty command")
+        return Command(seq, ops, False)
+    except (ProtocolError, ValueError) as e:
+        return Command(seq, [], False, str(e))
+
+def parse_binary(op, seq, payload):
+    try:
+        if op in (OP_SET, OP_CLEAR, OP_TOGGLE, OP_STATE):
+            if len(payload) != MASK.size:
+                raise ProtocolError("bad payload length")
+            return Command(seq, [(op, MASK.unpack(payload)[0])], True)
+        if op == OP_GREEN:
+            if len(payload) != 1 or payload[0] not in GREEN_VALUES:
+                raise ProtocolError("bad GREEN payload")
+            return Command(seq, [(op, payload[0])], True)
+        if op in (OP_GET, OP_STATS):
+            return Command(seq, [(op, 0)], True)
+        if op == OP_SCENE:
+            if not payload:
+                raise ProtocolError("SCENE expects a scene name")
+            return Command(seq, [(op, payload.decode('utf-8', 'replace'))], True)
+        if op == OP_BATCH:
+            if len(payload) % BATCH_ENTRY.size:
+                raise ProtocolError("bad batch length")
+            ops = [BATCH_ENTRY.unpack_from(payload, offset)
+                   for offset in range(0, len(payload), BATCH_ENTRY.size)]
+            for entry_op, arg in ops:
+                if entry_op not in (OP_SET, OP_CLEAR, OP_TOGGLE, OP_STATE, OP_GREEN, OP_GET):
+                    raise ProtocolError("bad batch op: {}".format(entry_op))
+                if entry_op == OP_GREEN and arg not in GREEN_VALUES:
+                    raise ProtocolError("bad GREEN argument: {}".format(arg))
+            return Command(seq, ops, True)
+        raise ProtocolError("unknown op: {}".format(op))
+    except ProtocolError as e:
+        return Command(seq, [], True, str(e))
+
+
+# Splits a byte stream into commands, whatever way TCP coalesced or split the sends
+class Decoder(object):
+
+    def __init__(self, max_line=MAX_LINE):
+        self.buffer = bytearray()
+        self.max_line = max_line
+
+    def feed(self, data):
+        self.buffer += data
+        commands = []
+        while self.buffer:
+            if self.buffer[0] == MAGIC:
+                if len(self.buffer) < HEADER.size:
+                    break
+                magic, op, seq, length = HEADER.unpack_from(self.buffer)
+                end = HEADER.size + length
+                if len(self.buffer) < end:
+                    break
+                commands.append(parse_binary(op, seq, bytes(self.buffer[HEADER.size:end])))
+                del self.buffer[:end]
+            else:
+                newline = self.buffer.find(b'\n')
+                if newline < 0:
+                    if len(self.buffer) > self.max_line:
+                        raise ProtocolError("line too long")
+                    break
+                line = self.buffer[:newline].decode('utf-8', 'replace').strip()
+                del self.buffer[:newline + 1]
+                if line:
+                    commands.append(parse_text(line))
+        return commands
+
+
+def encode_binary(op, seq, payload=b''):
+    return HEADER.pack(MAGIC, op, seq, len(payload)) + payload
+
+def encode_reply(command, mask, green):
+    if command.binary:
+        if command.error:
+            return encode_binary(OP_NAK, command.seq or 0, command.error.encode('utf-8')[:255])
+        return encode_binary(OP_ACK, command.seq or 0, ACK_PAYLOAD.pack(mask, 1 if green else 0))
+
+    seq = '' if command.seq is None else ' {}'.format(command.seq)
+    if command.error:
+        return 'ERR{} {}\n'.format(seq, command.error).encode('utf-8')
+    keys = ','.join(str(key) for key in mask_to_keys(mask)) or '-'
+    return 'OK{} {} GREEN {}\n'.format(seq, keys, 'ON' if green else 'OFF').encode('utf-8')
+
+def wants_stats(command):
+    return any(op == OP_STATS for op, arg in command.ops)
+
+def scene_requests(command):
+    return [arg for op, arg in command.ops if op == OP_SCENE]
+
+# Reply to a STATS request; `stats` as returned by frame_timing.FrameTimer.stats()
+def encode_stats(command, stats):
+    if command.binary:
+        return encode_binary(OP_STATS_REPLY, command.seq or 0, json.dumps(stats).encode('utf-8'))
+    seq = '' if command.seq is None else ' {}'.format(command.seq)
+    return 'STATS{} {}\n'.format(seq, format_stats(stats) or '-').encode('utf-8')
+
+# Apply a command's operations to (key mask, green) and return the new pair
+def apply_ops(ops, mask, green):
+    for op, arg in ops:
+        if op == OP_SET:
+            mask |= arg
+        elif op == OP_CLEAR:
+            mask &= ~arg
+        elif op == OP_TOGGLE:
+            mask ^= arg
+        elif op == OP_STATE:
+            mask = arg
+        elif op == OP_GREEN:
+            green = (not green) if arg == GREEN_TOGGLE else bool(arg)
+    return mask & ((1 << NUM_KEYS) - 1), green
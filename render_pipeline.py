@@ -0,0 +1,251 @@
+import multiprocessing
+import queue
+import time
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from frame_timing import FrameTimer, format_stats
+
+# Frame slots in the shared memory ring; the renderer can be this many frames
+# minus one ahead of the output process
+SLOTS = 3
+# Seconds to wait for a free slot before checking the output process is still alive
+STALL_CHECK = 1.0
+
+# Kinds of frame sent to the output process
+FRAME_FULL = 0
+FRAME_REGIONS = 1
+FRAME_NATIVE = 2
+FRAME_CLEAR = 3
+
+
+# Stands in for the framebuffer on the render side and hands frames to an output
+# process that owns the real one (made by `fb_factory` in that process), so
+# conversion and the framebuffer write overlap with drawing the next frame.
+#
+# Frames travel through a ring of shared memory slots: write() copies the frame
+# into a free slot and queues (seq, slot, kind, regions); the output process
+# converts it, writes it and returns the slot. When every slot is in use the
+# renderer waits (back-pressure) rather than dropping frames, since the dirty
+# regions of a frame are only valid on top of the previous one. A gap in the
+# sequence numbers makes the output process repaint the whole frame.
+class PipelineFramebuffer(object):
+
+    def __init__(self, fb_factory, slots=SLOTS):
+        self.timer = None
+        self.frames = 0
+        self.stalls = 0
+        self.stall_time = 0.0
+        self.output_stats = None
+        self._seq = 0
+        self._last_packed = None
+        self._last_regions = []
+        self._scaled = None
+        context = multiprocessing.get_context('spawn')
+        self._free = context.Queue()
+        self._ready = context.Queue()
+        self._status = context.Queue()
+        self.process = context.Process(target=_output_main,
+                                       args=(fb_factory, self._free, self._ready, self._status))
+        self.process.daemon = True
+        self.process.start()
+
+        while True:
+            try:
+                message = self._status.get(timeout=STALL_CHECK)
+                break
+            except queue.Empty:
+                if not self.process.is_alive():
+                    self.process.join()
+                    raise RuntimeError("Output process exited with code {} before opening the framebuffer"
+                                       .format(self.process.exitcode))
+        if message[0] == 'error':
+            self.process.join()
+            raise RuntimeError("Output process failed: {}".format(message[1]))
+        self.xres, self.yres, self.bits_per_pixel = message[1:]
+        self.bytes_per_pixel = self.bits_per_pixel // 8
+        self.channels = max(3, self.bytes_per_pixel)
+        slot_size = self.yres * self.xres * self.channels
+        self.memory = shared_memory.SharedMemory(create=True, size=slot_size * slots)
+        buffer = np.ndarray((slots, self.yres, self.xres, self.channels), dtype=np.uint8,
+                            buffer=self.memory.buf)
+        self.slots = [buffer[slot, :, :, :3] for slot in range(slots)]
+        self.native = [buffer[slot, :, :, :self.bytes_per_pixel] for slot in range(slots)]
+        # Frames are drawn as BGR; StaticLayer.packed() sizes its cache from this
+        self.pages = [np.empty((self.yres, self.xres, 3), dtype=np.uint8)]
+        self._ready.put((self.memory.name, slots))
+        for slot in range(slots):
+            self._free.put(slot)
+
+    def _acquire(self):
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        self.stalls += 1
+        start = time.perf_counter()
+        while True:
+            try:
+                slot = self._free.get(timeout=STALL_CHECK)
+                break
+            except queue.Empty:
+                if not self.process.is_alive():
+                    raise RuntimeError("Output process exited")
+        self.stall_time += time.perf_counter() - start
+        self._mark('wait')
+        return slot
+
+    def _send(self, slot, kind, regions=None):
+        self._ready.put((self._seq, slot, kind, regions))
+        self._seq += 1
+        if kind != FRAME_CLEAR:
+            self.frames += 1
+        self._mark('send')
+
+    # Give the slot back if filling it fails, so the ring does not shrink
+    def _fill(self, fill):
+        slot = self._acquire()
+        try:
+            fill(slot)
+        except Exception:
+            self._free.put(slot)
+            raise
+        return slot
+
+    def write(self, image):
+        slot = self._fill(lambda slot: self.convert_into(image, self.slots[slot]))
+        self._last_packed = None
+        self._send(slot, FRAME_FULL)
+
+    def write_regions(self, image, regions):
+        if image.shape[:2] != (self.yres, self.xres):
+            self.write(image)
+            return
+        slot = self._fill(lambda slot: np.copyto(self.slots[slot], image))
+        self._mark('copy')
+        self._last_packed = None
+        self._send(slot, FRAME_REGIONS, list(regions))
+
+    # `packed` is a cached BGR layer from StaticLayer.packed(); frames in the
+    # framebuffer pixel format go through write_native()
+    def write_over(self, packed, image=None, regions=()):
+        def fill(slot):
+            dst = self.slots[slot]
+            np.copyto(dst, packed)
+            if image is not None:
+                for x0, y0, x1, y1 in regions:
+                    self.convert_into(image[y0:y1, x0:x1], dst[y0:y1, x0:x1])
+        slot = self._fill(fill)
+        self._mark('copy')
+        regions = list(regions) if image is not None else []
+        if packed is self._last_packed:
+            # Same background as last frame: only what was drawn on it then and now changed
+            self._send(slot, FRAME_REGIONS, self._last_regions + regions)
+        else:
+            self._send(slot, FRAME_FULL)
+        self._last_packed = packed
+        self._last_regions = regions
+
+    def write_native(self, frame):
+        slot = self._fill(lambda slot: np.copyto(self.native[slot], frame))
+        self._mark('copy')
+        self._last_packed = None
+        self._send(slot, FRAME_NATIVE)
+
+    # Frames are passed on as BGR, only scaled to the framebuffer size. Slots are
+    # views into a wider buffer at 32 bpp, which cv2.resize cannot write to, so
+    # scaling goes through a scratch buffer.
+    def convert_into(self, image, dst, origin=(0, 0)):
+        if image.shape[:2] != dst.shape[:2]:
+            shape = dst.shape[:2] + image.shape[2:]
+            if self._scaled is None or self._scaled.shape != shape or self._scaled.dtype != image.dtype:
+                self._scaled = np.empty(shape, dtype=image.dtype)
+            cv2.resize(image, (dst.shape[1], dst.shape[0]), dst=self._scaled)
+            image = self._scaled
+            self._mark('resize')
+        np.copyto(dst, image)
+
+    def _mark(self, stage):
+        if self.timer is not None:
+            self.timer.mark(stage)
+
+    def clear(self):
+        self._last_packed = None
+        self._send(None, FRAME_CLEAR)
+
+    def close(self):
+        if self.process is None:
+            return
+        self._ready.put(None)
+        try:
+            message = self._status.get(timeout=5.0)
+            if message[0] == 'stats':
+                self.output_stats = message[1:]
+        except queue.Empty:
+            pass
+        self.process.join(5.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process = None
+        self.slots = self.native = None
+        self.memory.close()
+        self.memory.unlink()
+        print(self.summary())
+
+    def summary(self):
+        text = "Render pipeline: {} frames sent, {} stalls waiting {:.3f} s".format(
+            self.frames, self.stalls, self.stall_time)
+        if self.output_stats is not None:
+            frames, gaps, stats = self.output_stats
+            text += "; output {} frames, {} gaps, {}".format(frames, gaps, format_stats(stats))
+        return text
+
+
+# Output process: opens the framebuffer, reports its geometry, then writes frames
+# from the ring in order until told to stop
+def _output_main(fb_factory, free, ready, status):
+    try:
+        fb = fb_factory()
+    except Exception as e:
+        status.put(('error', str(e)))
+        return
+    status.put(('geometry', fb.xres, fb.yres, fb.bits_per_pixel))
+    name, slots = ready.get()
+    memory = shared_memory.SharedMemory(name=name)
+    channels = max(3, fb.bytes_per_pixel)
+    buffer = np.ndarray((slots, fb.yres, fb.xres, channels), dtype=np.uint8, buffer=memory.buf)
+    timer = FrameTimer()
+    fb.timer = timer
+    frames = 0
+    gaps = 0
+    expected = 0
+    try:
+        while True:
+            item = ready.get()
+            if item is None:
+                break
+            seq, slot, kind, regions = item
+            if seq != expected:
+                gaps += 1
+                if kind == FRAME_REGIONS:
+                    kind = FRAME_FULL
+            expected = seq + 1
+            if kind == FRAME_CLEAR:
+                fb.clear()
+                continue
+
+            timer.begin()
+            if kind == FRAME_NATIVE:
+                fb.write_native(buffer[slot, :, :, :fb.bytes_per_pixel])
+            elif kind == FRAME_REGIONS:
+                fb.write_regions(buffer[slot, :, :, :3], regions)
+            else:
+                fb.write(buffer[slot, :, :, :3])
+            timer.end()
+            free.put(slot)
+            frames += 1
+    finally:
+        status.put(('stats', frames, gaps, timer.stats()))
+        buffer = None
+        memory.close()
+        fb.close()
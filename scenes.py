@@ -0,0 +1,253 @@
+import cv2
+import numpy as np
+from frame_ingest import FORMAT_NATIVE
+from keyboard_renderer import KeyboardRenderer, draw_plain_keyboard, draw_rectangle, key_rectangles
+from layers import StaticLayer, circle_region, text_region
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+# Something the display engine can show. The engine calls start() when the scene
+# becomes current, then render() once per frame slot; render() draws into
+# `self.frame` and pushes what changed to engine.fb. Event-driven scenes are only
+# rendered when engine.render_signal fires (or on the engine's keep-alive).
+# `inputs` names the engine servers the scene needs: 'control', 'message', 'stream'.
+class Scene(object):
+
+    name = None
+    event_driven = False
+    inputs = ()
+    # Prefix of the periodic snapshot files
+    snapshot_name = 'dlp2000_output'
+
+    def __init__(self, width=720, height=480):
+        self.width = width
+        self.height = height
+        self.frame = np.zeros((height, width, 3), dtype=np.uint8)
+
+    def start(self, engine):
+        self.invalidate()
+
+    def stop(self, engine):
+        pass
+
+    # Repaint everything on the next render (the screen was used by something else)
+    def invalidate(self):
+        pass
+
+    def render(self, engine):
+        raise NotImplementedError
+
+
+# A half-size key grid inset from the bottom right corner, clear of the markers
+def inset_key_grid(width, height, rows=2, cols=5, margin=30):
+    keys = key_rectangles(width, height, rows, cols, scale=0.5)
+    right = max(bottom_right[0] for text, top_left, bottom_right in keys)
+    bottom = max(bottom_right[1] for text, top_left, bottom_right in keys)
+    return key_rectangles(width, height, rows, cols, scale=0.5,
+                          origin=(width - margin - right, height - margin - bottom))
+
+def draw_inset_key_grid(image, rows=2, cols=5):
+    height, width = image.shape[:2]
+    for text, top_left, bottom_right in inset_key_grid(width, height, rows, cols):
+        draw_rectangle(image, top_left, bottom_right, text)
+    return image
+
+
+# Static background with a circle moving across it; only the circle's region (and
+# whatever overlay() adds) is converted each frame, the rest comes from the
+# background already packed in the framebuffer format.
+class MovingCircleScene(Scene):
+
+    def __init__(self, width=720, height=480):
+        Scene.__init__(self, width, height)
+        self.background = StaticLayer(self.draw_background)
+        self.count = 0
+
+    def draw_background(self, image):
+        raise NotImplementedError
+
+    # Draw per-frame extras into self.frame, returns their dirty regions
+    def overlay(self, engine):
+        return []
+
+    def render(self, engine):
+        np.copyto(self.frame, self.background.get(self.width, self.height))
+        center = (int(self.width/2 + 100*np.sin(self.count*0.05)), int(self.height/2))
+        cv2.circle(self.frame, center, 50, (0, 0, 255), -1)
+        dirty = [circle_region(center, 50, self.width, self.height)]
+        dirty += self.overlay(engine)
+        self.count += 1
+        engine.frame_timer.mark('draw')
+
+        engine.fb.write_over(self.background.packed(engine.fb), self.frame, dirty)
+
+
+class TestPatternScene(MovingCircleScene):
+
+    name = 'test'
+
+    def draw_background(self, image):
+        cv2.rectangle(image, (100, 100), (200, 200), (0, 255, 0), 3)
+        pts = np.array([[300, 100], [200, 300], [400, 300]], np.int32)
+        cv2.fillPoly(image, [pts], (255, 255, 0))
+        cv2.putText(image, 'DLP2000 Test', (10, 30), FONT, 1, (255, 255, 255), 2, cv2.LINE_AA)
+        return draw_inset_key_grid(image)
+
+
+# The TCP demo: shows 'Click' for a frame whenever a CLICK message arrives on the
+# engine's message port
+class TcpDemoScene(MovingCircleScene):
+
+    name = 'tcp'
+    inputs = ('message',)
+
+    def __init__(self, width=720, height=480):
+        MovingCircleScene.__init__(self, width, height)
+        self.click_origin = (width//2, height//2)
+        click_size, click_baseline = cv2.getTextSize('Click', FONT, 1, 2)
+        self.click_region = text_region(self.click_origin, click_size, click_baseline, 2, width, height)
+
+    def draw_background(self, image):
+        cv2.putText(image, 'DLP2000 TCPTest', (10, 30), FONT, 1, (255, 255, 255), 2, cv2.LINE_AA)
+        return draw_inset_key_grid(image)
+
+    def overlay(self, engine):
+        display_click = False
+        while engine.messages:
+            if "CLICK" in engine.messages.popleft():
+                display_click = True
+        if not display_click:
+            engine.log.debug("Not displaying 'Click' on screen", every=1.0)
+            return []
+        cv2.putText(self.frame, 'Click', self.click_origin, FONT, 1, (255, 255, 255), 2, cv2.LINE_AA)
+        engine.log.debug("Displaying 'Click' on screen", every=1.0)
+        return [self.click_region]
+
+
+# The on-screen keyboard driven by engine.key_state, with its green screen mode
+class KeyboardScene(Scene):
+
+    name = 'keyboard'
+    event_driven = True
+    inputs = ('control',)
+    snapshot_name = 'dlp2000_keyboard_output'
+
+    def __init__(self, width=720, height=480, rows=2, cols=5):
+        Scene.__init__(self, width, height)
+        self.renderer = KeyboardRenderer(width, height, rows, cols)
+        self.green_frame = np.full((height, width, 3), (0, 255, 0), dtype=np.uint8)
+        self.green_shown = False
+
+    def invalidate(self):
+        self.renderer.invalidate()
+        self.green_shown = False
+
+    def render(self, engine):
+        version, mask, green = engine.key_state.snapshot()
+        if green:
+            self.frame = self.green_frame
+            if not self.green_shown:
+                engine.fb.write(self.frame)
+                self.renderer.invalidate()
+                self.green_shown = True
+        else:
+            dirty = self.renderer.render(mask, version)
+            self.frame = self.renderer.frame
+            engine.frame_timer.mark('render')
+            if dirty:
+                engine.fb.write_regions(self.frame, dirty)
+            self.green_shown = False
+
+
+# A fixed image drawn once into self.frame and written once; nothing changes
+# until the scene is invalidated
+class StillScene(Scene):
+
+    event_driven = True
+
+    def __init__(self, width=720, height=480):
+        Scene.__init__(self, width, height)
+        self.draw(self.frame)
+        self.shown = False
+
+    def draw(self, image):
+        raise NotImplementedError
+
+    def invalidate(self):
+        self.shown = False
+
+    def render(self, engine):
+        if not self.shown:
+            engine.fb.write(self.frame)
+            self.shown = True
+
+
+class GreenScreenScene(StillScene):
+
+    name = 'green'
+
+    def draw(self, image):
+        image[:] = (0, 255, 0)
+
+
+# The keyboard of opencv_keyboard.py: green keys with white labels and no key
+# state, unlike the interactive 'keyboard' scene
+class PlainKeyboardScene(StillScene):
+
+    name = 'plain_keyboard'
+    snapshot_name = 'dlp2000_keyboard_output'
+
+    def draw(self, image):
+        draw_plain_keyboard(image)
+
+
+# Frames streamed to the engine (see frame_ingest.py), latest frame wins. BGR
+# frames are copied into the scene's own frame, which snapshots read, and their
+# buffer goes straight back to the mailbox. Native frames cannot be snapshotted;
+# their buffer is held until the next frame so keep-alive repaints can reuse it.
+class StreamScene(Scene):
+
+    name = 'stream'
+    event_driven = True
+    inputs = ('stream',)
+    snapshot_name = 'dlp2000_stream_output'
+
+    def __init__(self, width=720, height=480):
+        Scene.__init__(self, width, height)
+        self.held = None
+        self.repaint = True
+
+    def invalidate(self):
+        self.repaint = True
+
+    def render(self, engine):
+        item = engine.frames.take()
+        if item is not None:
+            frame, (seq, fmt) = item
+            if self.held is not None:
+                engine.frames.release(self.held)
+                self.held = None
+            if fmt == FORMAT_NATIVE:
+                self.held = frame
+            else:
+                if self.frame.shape != frame.shape:
+                    self.frame = np.empty_like(frame)
+                np.copyto(self.frame, frame)
+                engine.frames.release(frame)
+            engine.frame_timer.mark('take')
+            self.repaint = True
+        if not self.repaint:
+            return
+
+        if self.held is not None:
+            engine.fb.write_native(self.held)
+        else:
+            engine.fb.write(self.frame)
+        self.repaint = False
+
+
+SCENES = [TestPatternScene, KeyboardScene, PlainKeyboardScene, TcpDemoScene, GreenScreenScene, StreamScene]
+
+def default_scenes(width=720, height=480):
+    return [scene(width, height) for scene in SCENES]
@@ -0,0 +1,101 @@
+import threading
+import time
+
+
+# Paces a render loop on absolute deadlines of a monotonic clock, so the period
+# does not stretch by the render time. A frame that starts after its deadline is
+# late; whole slots that passed while a frame was late are dropped and the
+# schedule resumes at the next slot instead of trying to catch up.
+class FrameScheduler(object):
+
+    def __init__(self, fps=60, clock=time.monotonic, sleep=time.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.set_fps(fps)
+        self.reset()
+
+    def set_fps(self, fps):
+        self.fps = fps
+        self.period = 1.0 / fps
+
+    def reset(self):
+        self.next_deadline = None
+        self.frames = 0
+        self.late = 0
+        self.dropped = 0
+        self.jitter_total = 0.0
+        self.jitter_max = 0.0
+
+    # Block until the next frame slot, returns its deadline
+    def wait(self):
+        now = self.clock()
+        if self.next_deadline is None:
+            self.next_deadline = now
+
+        deadline = self.next_deadline
+        if now < deadline:
+            self.sleep(deadline - now)
+            now = self.clock()
+        elif now - deadline >= self.period:
+            missed = int((now - deadline) // self.period)
+            self.late += 1
+            self.dropped += missed
+            deadline += missed * self.period
+        elif now > deadline:
+            self.late += 1
+
+        jitter = abs(now - deadline)
+        self.jitter_total += jitter
+        self.jitter_max = max(self.jitter_max, jitter)
+        self.frames += 1
+        self.next_deadline = deadline + self.period
+        return deadline
+
+    # Time left before the next slot, e.g. to bound a blocking wait for input
+    def time_until_next(self):
+        if self.next_deadline is None:
+            return 0.0
+        return max(self.next_deadline - self.clock(), 0.0)
+
+    def stats(self):
+        return {
+            'fps': self.fps,
+            'frames': self.frames,
+            'late': self.late,
+            'dropped': self.dropped,
+            'jitter_mean_ms': 1000.0 * self.jitter_total / self.frames if self.frames else 0.0,
+            'jitter_max_ms': 1000.0 * self.jitter_max,
+        }
+
+    def summary(self):
+        return ("Frames: {frames} at {fps} FPS, late: {late}, dropped: {dropped}, "
+                "jitter mean {jitter_mean_ms:.2f} ms, max {jitter_max_ms:.2f} ms").format(**self.stats())
+
+    # Forget a deadline that passed while the loop was idle on purpose (e.g. waiting
+    # for a RenderSignal), so the gap is not counted as late or dropped frames
+    def resync(self):
+        if self.next_deadline is not None and self.clock() > self.next_deadline:
+            self.next_deadline = None
+
+
+# Wakes an event-driven render loop when shared state changes. State writers call
+# notify() after a mutation; the loop blocks in wait() while nothing is pending.
+class RenderSignal(object):
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.pending = False
+
+    def notify(self):
+        with self.condition:
+            self.pending = True
+            self.condition.notify_all()
+
+    # Returns True if a change was signalled, False if the timeout expired first
+    def wait(self, timeout=None):
+        with self.condition:
+            if not self.pending:
+                self.condition.wait(timeout)
+            pending = self.pending
+            self.pending = False
+            return pending
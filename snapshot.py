@@ -0,0 +1,90 @@
+import queue
+import threading
+import cv2
+
+# imwrite parameter carrying the compression setting of each format
+COMPRESSION_PARAMS = {
+    'png': cv2.IMWRITE_PNG_COMPRESSION,  # 0 (fastest) .. 9 (smallest)
+    'jpg': cv2.IMWRITE_JPEG_QUALITY,     # 0 .. 100
+    'webp': cv2.IMWRITE_WEBP_QUALITY,    # 1 .. 100
+}
+
+DROP_NEWEST = 'drop_newest'
+DROP_OLDEST = 'drop_oldest'
+
+
+# Encodes and saves snapshots on a background thread so a render loop never waits
+# for PNG compression or the disk. submit() copies the frame, so the caller may
+# keep drawing into it. At most `max_pending` snapshots wait for the writer; when
+# the disk falls behind, `policy` drops either the new snapshot or the oldest queued one.
+class SnapshotWriter(object):
+
+    def __init__(self, fmt='png', compression=None, max_pending=2, policy=DROP_NEWEST):
+        if fmt not in COMPRESSION_PARAMS:
+            raise ValueError("Unsupported snapshot format: {}".format(fmt))
+        if policy not in (DROP_NEWEST, DROP_OLDEST):
+            raise ValueError("Unknown drop policy: {}".format(policy))
+        self.fmt = fmt
+        self.params = [] if compression is None else [COMPRESSION_PARAMS[fmt], int(compression)]
+        self.policy = policy
+        self.queue = queue.Queue(max_pending)
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    # Queue `image` to be saved as <name>.<fmt>. Returns False if it was dropped.
+    def submit(self, image, name):
+        path = '{}.{}'.format(name, self.fmt)
+        if self.policy == DROP_NEWEST and self.queue.full():
+            self.dropped += 1
+            return False
+
+        item = (image.copy(), path)
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return True
+            except queue.Full:
+                if self.policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+            try:
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+
+    # Wait until every queued snapshot has been written
+    def flush(self):
+        self.queue.join()
+
+    def close(self):
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+
+    def summary(self):
+        return "Snapshots written: {}, dropped: {}, failed: {}".format(self.written, self.dropped, self.failed)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                image, path = item
+                if cv2.imwrite(path, image, self.params):
+                    self.written += 1
+                    print("Snapshot saved: {}".format(path))
+                else:
+                    self.failed += 1
+                    print("Error saving snapshot: {}".format(path))
+            except Exception as e:
+                self.failed += 1
+                print("Error saving snapshot: {}".format(str(e)))
+            finally:
+                self.queue.task_done()